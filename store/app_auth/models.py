@@ -1,10 +1,15 @@
-import os
-
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_delete, pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
+from app_media.jobs import enqueue_file_deletion, enqueue_processing, stored_paths
+from app_media.variants import needs_variants
+from store.conditional import mark_changed
+
+# fields of the users shown with their reviews on the product pages
+REVIEW_AUTHOR_FIELDS = {'username', 'first_name', 'email'}
+
 
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -32,20 +37,31 @@ class Avatar(models.Model):
         default='image'
     )
     profile = models.OneToOneField(Profile, on_delete=models.CASCADE)
+    variants = models.JSONField(verbose_name='resized renditions', default=dict, blank=True)
 
 
 @receiver(pre_save, sender=Avatar)
 def delete_old_image_file(sender, instance, **kwargs):
     if instance.pk:
-        old_instance = Avatar.objects.get(pk=instance.pk)
-        old_image_path = old_instance.src.path
-        if os.path.isfile(old_image_path):
-            os.remove(old_image_path)
+        old_instance = Avatar.objects.filter(pk=instance.pk).first()
+        if old_instance is not None and old_instance.src.name != instance.src.name:
+            enqueue_file_deletion(stored_paths(old_instance))
+
+
+@receiver(post_save, sender=Avatar)
+def queue_image_processing(sender, instance, **kwargs):
+    if needs_variants(instance):
+        enqueue_processing(instance)
 
 
 @receiver(post_delete, sender=Avatar)
 def delete_image_file(sender, instance, **kwargs):
-    if instance.src:
-        image_path = instance.src.path
-        if os.path.isfile(image_path):
-            os.remove(image_path)
+    enqueue_file_deletion(stored_paths(instance))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def mark_user_changed(sender, update_fields=None, **kwargs):
+    # validators of the product pages, not for the last_login of every sign in
+    if update_fields is None or not update_fields.isdisjoint(REVIEW_AUTHOR_FIELDS):
+        mark_changed(sender)
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import Profile, User, Avatar
+from app_media.serializers import SrcsetField
 
 
 class CreateUserSerializer(serializers.ModelSerializer):
@@ -36,9 +37,11 @@ class CreateUserSerializer(serializers.ModelSerializer):
 
 
 class AvatarSerializer(serializers.ModelSerializer):
+    srcset = SrcsetField()
+
     class Meta:
         model = Avatar
-        fields = ['src', 'alt']
+        fields = ['src', 'alt', 'srcset']
 
 
 class ProfileSerializer(serializers.ModelSerializer):
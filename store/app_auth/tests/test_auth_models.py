@@ -1,7 +1,9 @@
 import os
+from io import StringIO
 
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth.models import User
+from django.core.management import call_command
 from rest_framework.test import APITestCase
 from app_auth.models import Profile, Avatar
 
@@ -54,7 +56,10 @@ class ProfileModelsTestCase(APITestCase):
         path = self.avatar.src.path
         self.assertTrue(os.path.exists(path))
         self.avatar.src = SimpleUploadedFile('test_avatar_1.png', b'file data')
-        self.avatar.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.avatar.save()
+        self.assertTrue(os.path.exists(path))
+        call_command('process_image_jobs', once=True, stdout=StringIO())
         self.assertFalse(os.path.exists(path))
         self.assertEqual(self.avatar.src.path.split('/')[-1], 'test_avatar_1.png')
 
@@ -73,5 +78,8 @@ class ProfileModelsTestCase(APITestCase):
         path = avatar.src.path
 
         self.assertTrue(os.path.exists(path))
-        avatar.delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            avatar.delete()
+        self.assertTrue(os.path.exists(path))
+        call_command('process_image_jobs', once=True, stdout=StringIO())
         self.assertFalse(os.path.exists(path))
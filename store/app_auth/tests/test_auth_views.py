@@ -1,15 +1,25 @@
 import json
 import os
+from io import BytesIO, StringIO
 
 from django.contrib.auth.models import User
+from django.core.management import call_command
 from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image as PillowImage
 from rest_framework import status
 from rest_framework.test import APITestCase, APIClient
 
 from app_auth.models import Profile, Avatar
+from store.testing import QueryBudgetMixin
 
 
-class ProfileViewSetTest(APITestCase):
+def make_png():
+    buffer = BytesIO()
+    PillowImage.new('RGB', (4, 4)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class ProfileViewSetTest(QueryBudgetMixin, APITestCase):
 
     @classmethod
     def setUpClass(cls):
@@ -83,6 +93,14 @@ class ProfileViewSetTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+    def test_sign_in_malformed_json(self):
+        """Test that a sign-in body which is not JSON is a bad request"""
+        response = self.client.post(
+            '/api/sign-in', data='{"username": ', content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse('_auth_user_id' in self.client.session)
+
     def test_sign_in_view(self):
         """Test sign-in, sign-out view"""
         self.assertFalse('_auth_user_id' in self.client.session)
@@ -227,10 +245,19 @@ class ProfileViewSetTest(APITestCase):
         self.assertTrue(
             profile.avatar.src.name.split('/')[-1] == 'test_avatar.png'
         )
-        file = SimpleUploadedFile('new_test_avatar.png', b'file data')
+        # files Pillow cannot read are refused
+        broken = SimpleUploadedFile('broken_avatar.png', b'file data')
         response = self.client.post(
-            '/api/profile/avatar', {'avatar': file}, format='multipart'
+            '/api/profile/avatar', {'avatar': broken}, format='multipart'
         )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(profile.avatar.src.name.split('/')[-1], 'test_avatar.png')
+
+        file = SimpleUploadedFile('new_test_avatar.png', make_png())
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/profile/avatar', {'avatar': file}, format='multipart'
+            )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
         profile = Profile.objects.get(
@@ -243,8 +270,12 @@ class ProfileViewSetTest(APITestCase):
         self.assertTrue(
             profile.avatar.src.name.split('/')[-1] == 'new_test_avatar.png'
         )
-        prev_file = SimpleUploadedFile('test_avatar.png', b'file data')
-        response = self.client.post(
-            '/api/profile/avatar', {'avatar': prev_file}, format='multipart'
-        )
+        # the replaced file is removed by the image worker
+        call_command('process_image_jobs', once=True, stdout=StringIO())
+        prev_file = SimpleUploadedFile('test_avatar.png', make_png())
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/profile/avatar', {'avatar': prev_file}, format='multipart'
+            )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+        call_command('process_image_jobs', once=True, stdout=StringIO())
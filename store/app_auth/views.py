@@ -1,59 +1,32 @@
-import json
-
 import rest_framework.serializers
+from django import forms
 from django.contrib.auth import authenticate, login, logout
+from django.core.exceptions import ValidationError
 from rest_framework.views import APIView
 from rest_framework.response import Response
 
 from .serializers import CreateUserSerializer, UserSerializer
 from .models import Profile, Avatar
 
-from app_basket.models import BasketItem
-from app_products.models import Product
+from app_basket.models import merge_into_basket
+from app_basket.storage import pop_basket
+from store import json_api
 
 
 def addition_basket_from_cookie_to_db(user, request):
-    json_data: str | None = request.session.get('basket')
-    if json_data:
-
-        data: dict = json.loads(json_data)
-        products = map(int, data.keys())
-
-        basket_objs = (
-            BasketItem.objects
-            .filter(user=user, product__in=products)
-            .select_related('product')
-        )
-
-        for basket_obj in basket_objs:
-            product_id = str(basket_obj.product.id)
-            max_count = basket_obj.product.count
-            count_before = basket_obj.count
-            new_count = count_before + data.pop(product_id)
-            if new_count > max_count:
-                new_count = max_count
-
-            basket_obj.count = new_count
-            basket_obj.save()
-
-        while data:
-            product_id, count = data.popitem()
-            product = Product.objects.get(pk=product_id)
-            max_count = product.count
-            if count > max_count:
-                count = max_count
-            BasketItem.objects.create(
-                user=user,
-                product=product,
-                count=count
-            )
+    """
+    Move the anonymous basket to the basket of the user,
+    counts limited by the stock of the products.
+    """
+    merge_into_basket(user.id, pop_basket(request))
 
 
 class LoginAPIView(APIView):
+    query_budget = 14
 
     def post(self, request):
-        json_data = request.body.decode('utf-8')
-        data = json.loads(json_data)
+        # the frontend sends a JSON body whatever its content type says
+        data = json_api.loads(request.body)
 
         user = authenticate(
             request, username=data['username'], password=data['password']
@@ -68,11 +41,12 @@ class LoginAPIView(APIView):
 
 
 class RegistrationAPIView(APIView):
+    query_budget = 11
 
     def post(self, request):
 
-        data = list(request.data)
-        data = json.loads(data[0])
+        # the JSON of the form arrives as the only key of the parsed data
+        data = json_api.loads(next(iter(request.data), ''))
 
         serializer = CreateUserSerializer(data=data)
 
@@ -92,6 +66,7 @@ class RegistrationAPIView(APIView):
 
 
 class LogoutAPIView(APIView):
+    query_budget = 4
 
     def post(self, request):
         logout(request)
@@ -99,6 +74,7 @@ class LogoutAPIView(APIView):
 
 
 class ProfileAPIView(APIView):
+    query_budget = {'get': 4, 'post': 5}
 
     def get(self, request):
         user = request.user
@@ -122,6 +98,7 @@ class ProfileAPIView(APIView):
 
 
 class ChangePasswordAPIView(APIView):
+    query_budget = 4
 
     def post(self, request):
         data = request.data
@@ -143,21 +120,26 @@ class ChangePasswordAPIView(APIView):
 
 
 class AvatarAPIView(APIView):
+    query_budget = 8
+
     def post(self, request):
-        profile = Profile.objects.filter(user=request.user)
+        # files Pillow cannot read are refused here, not left to the image jobs
+        try:
+            src = forms.ImageField().clean(request.FILES.get('avatar'))
+        except ValidationError as exc:
+            return Response({'message': f'unsuccessful operation {exc.messages}'}, status=400)
 
-        if profile:
-            profile = profile.first()
+        profile = Profile.objects.filter(user=request.user).first()
 
-            avatar = Avatar.objects.filter(profile=profile)
+        if profile:
+            avatar = Avatar.objects.filter(profile=profile).first()
             if avatar:
-                avatar = avatar.first()
-                avatar.src = request.FILES['avatar']
+                avatar.src = src
                 avatar.save()
             else:
                 Avatar.objects.create(
                     profile=profile,
-                    src=request.FILES['avatar'],
+                    src=src,
                     alt=profile
                 )
             return Response({'message': 'successful operation: avatar was changed'}, status=200)
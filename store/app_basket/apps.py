@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AppBasketConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app_basket'
+
+    def ready(self):
+        from . import checks  # noqa: F401
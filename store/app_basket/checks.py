@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+from django.utils.module_loading import import_string
+
+from app_basket.storage import CacheBasketStorage
+from store.checks import is_local_memory
+
+
+@register()
+def check_basket_storage(app_configs, **kwargs):
+    """Cache storages of anonymous baskets must not lose them"""
+    config = settings.BASKET_STORAGE
+    if (
+        issubclass(import_string(config['BACKEND']), CacheBasketStorage)
+        and is_local_memory(config['ALIAS'])
+    ):
+        return [Warning(
+            f"Anonymous baskets are kept in the local memory cache '{config['ALIAS']}'.",
+            hint=(
+                'They are culled past MAX_ENTRIES, lost on restart and not shared '
+                'by the workers: use DatabaseBasketStorage or a RedisCache alias.'
+            ),
+            id='app_basket.W001',
+        )]
+    return []
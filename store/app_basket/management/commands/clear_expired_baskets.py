@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from app_basket.storage import get_basket_storage
+
+
+class Command(BaseCommand):
+    help = "Delete the anonymous baskets left unchanged for BASKET_STORAGE['TIMEOUT']"
+
+    def handle(self, *args, **options):
+        deleted = get_basket_storage().clear_expired()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} basket rows'))
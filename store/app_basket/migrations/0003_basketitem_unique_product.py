@@ -0,0 +1,34 @@
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicates(apps, schema_editor):
+    """One row per user and product, with the sum of the counts"""
+    BasketItem = apps.get_model('app_basket', 'BasketItem')
+    duplicates = (
+        BasketItem.objects
+        .values('user_id', 'product_id')
+        .annotate(rows=Count('id'), first_id=Min('id'), total=Sum('count'))
+        .filter(rows__gt=1)
+    )
+    for duplicate in duplicates:
+        rows = BasketItem.objects.filter(
+            user_id=duplicate['user_id'], product_id=duplicate['product_id']
+        )
+        rows.exclude(id=duplicate['first_id']).delete()
+        rows.update(count=duplicate['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_basket', '0002_alter_basketitem_product'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='basketitem',
+            constraint=models.UniqueConstraint(fields=('user', 'product'), name='unique_basket_product'),
+        ),
+    ]
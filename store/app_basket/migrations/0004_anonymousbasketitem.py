@@ -0,0 +1,32 @@
+# Generated by Django 4.2.6 on 2026-10-18 18:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_products', '0014_delete_placeholder_images'),
+        ('app_basket', '0003_basketitem_unique_product'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnonymousBasketItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('basket_key', models.CharField(max_length=32, verbose_name='Basket key')),
+                ('count', models.PositiveIntegerField(verbose_name='Count')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated at')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app_products.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['updated_at'], name='anonymous_basket_updated')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='anonymousbasketitem',
+            constraint=models.UniqueConstraint(fields=('basket_key', 'product'), name='unique_anonymous_basket_product'),
+        ),
+    ]
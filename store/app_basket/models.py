@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import connection, models
 from django.contrib.auth.models import User
 
 from app_products.models import Product
@@ -8,3 +8,84 @@ class BasketItem(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='basket')
     count = models.PositiveIntegerField(verbose_name='Count')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'product'], name='unique_basket_product'
+            ),
+        ]
+
+
+class AnonymousBasketItem(models.Model):
+    """Products in the basket of an anonymous visitor (DatabaseBasketStorage)"""
+    basket_key = models.CharField(verbose_name='Basket key', max_length=32)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    count = models.PositiveIntegerField(verbose_name='Count')
+    updated_at = models.DateTimeField(verbose_name='Updated at', auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['basket_key', 'product'], name='unique_anonymous_basket_product'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['updated_at'], name='anonymous_basket_updated'),
+        ]
+
+
+def add_to_basket(user_id, product_id, count):
+    """
+    Add products to the basket of the user with one upsert statement.
+    The stock is checked by the same statement, so parallel requests cannot
+    put more than the stock in the basket. Returns False when refused.
+    """
+    basket_table = BasketItem._meta.db_table
+    product_table = Product._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'''
+            INSERT INTO {basket_table} (user_id, product_id, count)
+            SELECT %s, product.id, %s
+            FROM {product_table} AS product
+            WHERE product.id = %s AND product.count >= %s
+            ON CONFLICT (user_id, product_id) DO UPDATE
+            SET count = {basket_table}.count + excluded.count
+            WHERE (
+                SELECT product.count FROM {product_table} AS product
+                WHERE product.id = excluded.product_id
+            ) >= {basket_table}.count + excluded.count
+            ''',
+            [user_id, count, product_id, count]
+        )
+        return cursor.rowcount > 0
+
+
+def merge_into_basket(user_id, items):
+    """
+    Add ``{product_id: count}`` to the basket of the user with one upsert
+    statement, every count limited by the stock of the product.
+    """
+    if not items:
+        return
+    basket_table = BasketItem._meta.db_table
+    product_table = Product._meta.db_table
+    values = ', '.join(['(%s, %s)'] * len(items))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'''
+            WITH added (product_id, count) AS (VALUES {values})
+            INSERT INTO {basket_table} (user_id, product_id, count)
+            SELECT %s, product.id, MIN(added.count, product.count)
+            FROM added JOIN {product_table} AS product ON product.id = added.product_id
+            WHERE product.count > 0
+            ON CONFLICT (user_id, product_id) DO UPDATE
+            SET count = (
+                SELECT MIN({basket_table}.count + excluded.count, product.count)
+                FROM {product_table} AS product
+                WHERE product.id = excluded.product_id
+            )
+            ''',
+            [value for item in items.items() for value in item] + [user_id]
+        )
@@ -0,0 +1,316 @@
+"""
+Baskets of anonymous users.
+
+The session only keeps a random basket key, the content of the basket
+({product_id: count}) lives in a storage backend chosen by
+BASKET_STORAGE['BACKEND']:
+
+* DatabaseBasketStorage (default) keeps one AnonymousBasketItem row per
+  product, added to by one upsert which checks the stock limit, as the
+  baskets of users. Durable and shared by the workers like the sessions.
+* CacheBasketStorage keeps the basket as one value of a Django cache,
+  updated under a short lock taken with cache.add(). The cache must be
+  shared by the workers and not culled: a locmem alias is reported by the
+  app_basket.W001 check.
+* RedisBasketStorage keeps the basket as a Redis hash of the RedisCache
+  alias, every change is one atomic server-side script (HINCRBY-like).
+
+Baskets expire BASKET_STORAGE['TIMEOUT'] seconds after their last change,
+the clear_expired_baskets command deletes the expired rows.
+"""
+import json
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import AnonymousBasketItem
+
+SESSION_KEY = 'basket_key'
+LEGACY_SESSION_KEY = 'basket'
+
+
+class BasketBusy(Exception):
+    """The basket is being changed by another request for too long"""
+
+
+class BasketStorage:
+
+    def __init__(self, alias='default', timeout=14 * 24 * 60 * 60):
+        self.alias = alias
+        self.timeout = timeout
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def make_key(self, basket_key):
+        return f'basket:{basket_key}'
+
+    def get_items(self, basket_key):
+        """{product_id: count} of the basket"""
+        raise NotImplementedError
+
+    def add(self, basket_key, product_id, count, limit):
+        """
+        Add ``count`` products to the basket unless the total would exceed
+        ``limit``. Return the new count of the product, or None when refused.
+        """
+        raise NotImplementedError
+
+    def remove(self, basket_key, product_id, count):
+        """Remove up to ``count`` products, return the count left"""
+        raise NotImplementedError
+
+    def set_items(self, basket_key, items):
+        raise NotImplementedError
+
+    def clear(self, basket_key):
+        self.cache.delete(self.make_key(basket_key))
+
+    def pop_items(self, basket_key):
+        """Items of the basket, which is removed"""
+        items = self.get_items(basket_key)
+        self.clear(basket_key)
+        return items
+
+    def clear_expired(self):
+        """Delete the expired baskets, return their number of rows"""
+        return 0  # caches expire their values themselves
+
+
+class DatabaseBasketStorage(BasketStorage):
+    """The alias is not used, rows live in the default database"""
+
+    def rows(self, basket_key):
+        return AnonymousBasketItem.objects.filter(basket_key=basket_key)
+
+    def expired_before(self):
+        return timezone.now() - timedelta(seconds=self.timeout)
+
+    @staticmethod
+    def adapt(value):
+        # datetimes of raw SQL as the ORM writes them
+        return connection.ops.adapt_datetimefield_value(value)
+
+    def get_items(self, basket_key):
+        return dict(
+            self.rows(basket_key)
+            .filter(updated_at__gte=self.expired_before())
+            .values_list('product_id', 'count')
+        )
+
+    def add(self, basket_key, product_id, count, limit):
+        if count > limit:
+            return None
+        table = AnonymousBasketItem._meta.db_table
+        expired_before = self.adapt(self.expired_before())
+        with connection.cursor() as cursor:
+            # an expired row starts again from the added count
+            cursor.execute(
+                f'''
+                INSERT INTO {table} (basket_key, product_id, count, updated_at)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (basket_key, product_id) DO UPDATE
+                SET count = CASE WHEN {table}.updated_at < %s THEN excluded.count
+                                 ELSE {table}.count + excluded.count END,
+                    updated_at = excluded.updated_at
+                WHERE CASE WHEN {table}.updated_at < %s THEN excluded.count
+                           ELSE {table}.count + excluded.count END <= %s
+                RETURNING count
+                ''',
+                [basket_key, product_id, count, self.adapt(timezone.now()),
+                 expired_before, expired_before, limit]
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def remove(self, basket_key, product_id, count):
+        rows = self.rows(basket_key).filter(product_id=product_id)
+        if rows.filter(count__lte=count).delete()[0]:
+            return 0
+        rows.update(count=F('count') - count, updated_at=timezone.now())
+        return rows.values_list('count', flat=True).first() or 0
+
+    def set_items(self, basket_key, items):
+        self.clear(basket_key)
+        AnonymousBasketItem.objects.bulk_create(
+            AnonymousBasketItem(basket_key=basket_key, product_id=product_id, count=count)
+            for product_id, count in items.items() if count > 0
+        )
+
+    def clear(self, basket_key):
+        self.rows(basket_key).delete()
+
+    def pop_items(self, basket_key):
+        table = AnonymousBasketItem._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {table} WHERE basket_key = %s '
+                f'RETURNING product_id, count, updated_at >= %s',
+                [basket_key, self.adapt(self.expired_before())]
+            )
+            return {
+                product_id: count for product_id, count, fresh in cursor.fetchall() if fresh
+            }
+
+    def clear_expired(self):
+        return AnonymousBasketItem.objects.filter(
+            updated_at__lt=self.expired_before()
+        ).delete()[0]
+
+
+class CacheBasketStorage(BasketStorage):
+    lock_timeout = 5
+    lock_attempts = 100
+    lock_delay = 0.01
+
+    @contextmanager
+    def lock(self, basket_key):
+        lock_key = f'{self.make_key(basket_key)}:lock'
+        for _ in range(self.lock_attempts):
+            if self.cache.add(lock_key, 1, timeout=self.lock_timeout):
+                break
+            time.sleep(self.lock_delay)
+        else:
+            raise BasketBusy(basket_key)
+        try:
+            yield
+        finally:
+            self.cache.delete(lock_key)
+
+    def get_items(self, basket_key):
+        return self.cache.get(self.make_key(basket_key)) or {}
+
+    def set_items(self, basket_key, items):
+        key = self.make_key(basket_key)
+        if items:
+            self.cache.set(key, items, timeout=self.timeout)
+        else:
+            self.cache.delete(key)
+
+    def add(self, basket_key, product_id, count, limit):
+        with self.lock(basket_key):
+            items = self.get_items(basket_key)
+            total = items.get(product_id, 0) + count
+            if total > limit:
+                return None
+            items[product_id] = total
+            self.set_items(basket_key, items)
+        return total
+
+    def remove(self, basket_key, product_id, count):
+        with self.lock(basket_key):
+            items = self.get_items(basket_key)
+            left = max(items.get(product_id, 0) - count, 0)
+            if left:
+                items[product_id] = left
+            else:
+                items.pop(product_id, None)
+            self.set_items(basket_key, items)
+        return left
+
+
+class RedisBasketStorage(BasketStorage):
+    """Needs the alias to use django.core.cache.backends.redis.RedisCache"""
+
+    ADD_SCRIPT = '''
+        local total = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0') + tonumber(ARGV[2])
+        if total > tonumber(ARGV[3]) then
+            return -1
+        end
+        redis.call('HSET', KEYS[1], ARGV[1], total)
+        redis.call('EXPIRE', KEYS[1], ARGV[4])
+        return total
+    '''
+    REMOVE_SCRIPT = '''
+        local left = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0') - tonumber(ARGV[2])
+        if left > 0 then
+            redis.call('HSET', KEYS[1], ARGV[1], left)
+        else
+            left = 0
+            redis.call('HDEL', KEYS[1], ARGV[1])
+        end
+        redis.call('EXPIRE', KEYS[1], ARGV[3])
+        return left
+    '''
+
+    def make_key(self, basket_key):
+        return self.cache.make_and_validate_key(super().make_key(basket_key))
+
+    def client(self):
+        return self.cache._cache.get_client(write=True)
+
+    def get_items(self, basket_key):
+        items = self.client().hgetall(self.make_key(basket_key))
+        return {int(product_id): int(count) for product_id, count in items.items()}
+
+    def set_items(self, basket_key, items):
+        key = self.make_key(basket_key)
+        pipeline = self.client().pipeline()
+        pipeline.delete(key)
+        if items:
+            pipeline.hset(key, mapping=items)
+            pipeline.expire(key, self.timeout)
+        pipeline.execute()
+
+    def add(self, basket_key, product_id, count, limit):
+        total = self.client().eval(
+            self.ADD_SCRIPT, 1, self.make_key(basket_key),
+            product_id, count, limit, self.timeout
+        )
+        return None if total < 0 else total
+
+    def remove(self, basket_key, product_id, count):
+        return self.client().eval(
+            self.REMOVE_SCRIPT, 1, self.make_key(basket_key),
+            product_id, count, self.timeout
+        )
+
+    def clear(self, basket_key):
+        self.client().delete(self.make_key(basket_key))
+
+
+@lru_cache(maxsize=None)
+def get_basket_storage():
+    config = settings.BASKET_STORAGE
+    backend = import_string(config['BACKEND'])
+    return backend(alias=config['ALIAS'], timeout=config['TIMEOUT'])
+
+
+def get_basket_key(request, create=False):
+    """
+    Key of the anonymous basket of the session, a new one when ``create``.
+    A basket left in the session by the previous implementation is moved
+    to the storage.
+    """
+    basket_key = request.session.get(SESSION_KEY)
+    legacy_basket = request.session.pop(LEGACY_SESSION_KEY, None)
+    if basket_key is None and (create or legacy_basket):
+        basket_key = uuid.uuid4().hex
+        request.session[SESSION_KEY] = basket_key
+    if legacy_basket:
+        items = {
+            int(product_id): count
+            for product_id, count in json.loads(legacy_basket).items()
+        }
+        get_basket_storage().set_items(basket_key, items)
+    return basket_key
+
+
+def pop_basket(request):
+    """Items of the anonymous basket, which is removed with its key"""
+    basket_key = get_basket_key(request)
+    if basket_key is None:
+        return {}
+    items = get_basket_storage().pop_items(basket_key)
+    del request.session[SESSION_KEY]
+    return items
@@ -1,7 +1,8 @@
 from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
 from rest_framework.test import APITestCase
 
-from app_basket.models import BasketItem
+from app_basket.models import BasketItem, add_to_basket
 from app_products.models import Product
 from app_catalog.models import CatalogItem
 
@@ -37,3 +38,19 @@ class BasketModelsTestCase(APITestCase):
         self.assertEqual(self.basket.user.username, 'TestUser')
         self.assertEqual(self.basket.product.title, 'Product for tests # 1')
         self.assertEqual(self.basket.count, 2)
+
+    def test_add_to_basket_upsert(self):
+        """Test that adding to the basket is one row per product within the stock"""
+        user = User.objects.create_user(username='UpsertUser', password='12345')
+
+        self.assertFalse(add_to_basket(user.id, self.product.id, 4))
+        self.assertTrue(add_to_basket(user.id, self.product.id, 2))
+        self.assertTrue(add_to_basket(user.id, self.product.id, 1))
+        self.assertFalse(add_to_basket(user.id, self.product.id, 1))
+        self.assertEqual(
+            list(BasketItem.objects.filter(user=user).values_list('count', flat=True)),
+            [3]
+        )
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            BasketItem.objects.create(user=user, product=self.product, count=1)
@@ -1,15 +1,24 @@
 import json
+from datetime import date, timedelta
+from unittest import mock
 
 from django.contrib.auth.models import User
+from django.core.checks import run_checks
+from django.test import override_settings
+from django.utils import timezone
 from rest_framework.test import APITestCase
 from rest_framework import status
 
-from app_basket.models import BasketItem
-from app_products.models import Product
+from app_basket.models import AnonymousBasketItem, BasketItem
+from app_basket.storage import (
+    SESSION_KEY, BasketBusy, DatabaseBasketStorage, get_basket_storage
+)
+from app_products.models import Product, SaleItem
 from app_catalog.models import CatalogItem
+from store.testing import QueryBudgetMixin
 
 
-class BasketViewsTestCase(APITestCase):
+class BasketViewsTestCase(QueryBudgetMixin, APITestCase):
 
     @classmethod
     def setUpClass(cls):
@@ -140,6 +149,112 @@ class BasketViewsTestCase(APITestCase):
         self.assertEqual(response.data, 'too many goods')
 
 
+    def test_anonymous_basket_storage(self):
+        """Test that the session keeps only the key of an anonymous basket"""
+        two_prod_2 = json.dumps({'id': self.product_2.id, 'count': 2})
+        response = self.client.post(
+            '/api/basket', data=two_prod_2, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['count'], 2)
+
+        basket_key = self.client.session[SESSION_KEY]
+        self.assertEqual(list(self.client.session.keys()), [SESSION_KEY])
+        self.assertEqual(
+            get_basket_storage().get_items(basket_key), {self.product_2.id: 2}
+        )
+
+        response = self.client.post(
+            '/api/basket', data=two_prod_2, content_type='application/json'
+        )
+        self.assertEqual(response.data, 'too many goods')
+
+        response = self.client.delete(
+            '/api/basket',
+            data=json.dumps({'id': self.product_2.id, 'count': 5}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(get_basket_storage().get_items(basket_key), {})
+
+    def test_database_basket_storage(self):
+        """Test the stock limit, removal and expiry of the anonymous baskets in the database"""
+        storage = DatabaseBasketStorage(timeout=60)
+        self.assertEqual(storage.add('basket', self.product_2.id, 2, limit=3), 2)
+        self.assertIsNone(storage.add('basket', self.product_2.id, 2, limit=3))
+        self.assertEqual(storage.add('basket', self.product_1.id, 1, limit=2), 1)
+        self.assertEqual(storage.remove('basket', self.product_2.id, 1), 1)
+        self.assertEqual(
+            storage.get_items('basket'), {self.product_1.id: 1, self.product_2.id: 1}
+        )
+
+        AnonymousBasketItem.objects.filter(product=self.product_1).update(
+            updated_at=timezone.now() - timedelta(seconds=61)
+        )
+        self.assertEqual(storage.get_items('basket'), {self.product_2.id: 1})
+        # an expired row starts again from the added count
+        self.assertEqual(storage.add('other', self.product_1.id, 1, limit=2), 1)
+        self.assertEqual(storage.clear_expired(), 1)
+        self.assertEqual(storage.pop_items('basket'), {self.product_2.id: 1})
+        self.assertFalse(AnonymousBasketItem.objects.filter(basket_key='basket').exists())
+
+    def test_basket_busy(self):
+        """Test that a basket locked by another request answers 503, and the locmem warning"""
+        with mock.patch.object(
+            DatabaseBasketStorage, 'add', side_effect=BasketBusy('basket')
+        ):
+            response = self.client.post(
+                '/api/basket',
+                data=json.dumps({'id': self.product_1.id, 'count': 1}),
+                content_type='application/json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '1')
+
+        basket_storage = {
+            'BACKEND': 'app_basket.storage.CacheBasketStorage',
+            'ALIAS': 'default',
+            'TIMEOUT': 60,
+        }
+        with override_settings(BASKET_STORAGE=basket_storage):
+            warnings = [message.id for message in run_checks()]
+        self.assertIn('app_basket.W001', warnings)
+        self.assertNotIn('app_basket.W001', [message.id for message in run_checks()])
+
+    def test_basket_summary(self):
+        """Test basket totals for users and anonymous visitors"""
+        today = date.today()
+        SaleItem.objects.create(
+            product=self.product_2, sale_price=4, date_from=today, date_to=today
+        )
+        self.client.login(username=self.user.username, password='12345')
+        self.client.post(
+            '/api/basket',
+            data=json.dumps({'id': self.product_2.id, 'count': 2}),
+            content_type='application/json'
+        )
+        response = self.client.get('/api/basket/summary')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {
+            'itemCount': 2, 'totalQuantity': 3, 'subtotal': 9.99,
+            'freeDelivery': False,
+        })
+
+        self.client.logout()
+        response = self.client.get('/api/basket/summary')
+        self.assertEqual(response.data, {
+            'itemCount': 0, 'totalQuantity': 0, 'subtotal': 0.0,
+            'freeDelivery': False,
+        })
+        self.client.post(
+            '/api/basket',
+            data=json.dumps({'id': self.product_1.id, 'count': 2}),
+            content_type='application/json'
+        )
+        response = self.client.get('/api/basket/summary')
+        self.assertEqual(response.data['totalQuantity'], 2)
+        self.assertEqual(response.data['subtotal'], 3.98)
+
     def test_basket_saved_after_login(self):
         """Test for saving of basket from cookies to database"""
 
@@ -171,3 +286,34 @@ class BasketViewsTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         basket_from_database = BasketItem.objects.get(user=self.user)
         self.assertEqual(basket_from_database.count, 2)
+
+    def test_basket_merge_limited_by_stock(self):
+        """Test that the merged basket keeps counts within the stock"""
+        products = [self.product_1, self.product_2] + [
+            Product.objects.create(
+                title=f'Merged product # {number}', description='Merged product',
+                price=1, count=1, rating=1, category=self.category
+            )
+            for number in range(10)
+        ]
+        for product in products:
+            self.client.post(
+                '/api/basket',
+                data=json.dumps({'id': product.id, 'count': 1}),
+                content_type='application/json'
+            )
+        # more than the stock was added meanwhile
+        BasketItem.objects.filter(pk=self.basket_item.pk).update(count=2)
+
+        response = self.client.post(
+            '/api/sign-in',
+            data=json.dumps({'username': self.user.username, 'password': '12345'}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        counts = dict(
+            BasketItem.objects.filter(user=self.user).values_list('product_id', 'count')
+        )
+        self.assertEqual(len(counts), len(products))
+        self.assertEqual(counts[self.product_1.id], self.product_1.count)
+        self.assertEqual(counts[self.product_2.id], 1)
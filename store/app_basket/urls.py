@@ -1,10 +1,11 @@
 from django.urls import path
 from .views import (
-    BasketAPIView
+    BasketAPIView, BasketSummaryAPIView
 )
 
 
 urlpatterns = [
     path('basket', BasketAPIView.as_view(), name='basket'),
+    path('basket/summary', BasketSummaryAPIView.as_view(), name='basket-summary'),
 
 ]
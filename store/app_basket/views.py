@@ -1,17 +1,25 @@
-import json
-
-from django.db.models import Count, Prefetch
+from django.db.models import (
+    Case, Count, DecimalField, F, IntegerField, Q, Sum, When
+)
+from django.db.models.functions import Coalesce
 
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from app_products.models import Product
-from .serializers import BasketSerializer, AnonymBasket
+from app_catalog.serializers import PRODUCT_CARD_FIELDS, product_cards
+from app_products.models import Product, current_price
+
+from .models import BasketItem, add_to_basket
+from .storage import BasketBusy, get_basket_key, get_basket_storage
 
-from .models import BasketItem
+
+def basket_busy():
+    # another request holds the lock of the basket, the client may retry
+    return Response('basket is busy', status=503, headers={'Retry-After': '1'})
 
 
 class BasketAPIView(APIView):
+    query_budget = {'get': 6, 'post': 10, 'delete': 9}
 
     def post(self, request):
 
@@ -22,81 +30,51 @@ class BasketAPIView(APIView):
 
         if user.is_authenticated:
 
-            basket_obj = BasketItem.objects.filter(user=user, product=product)
-            if basket_obj:
-                basket_obj = basket_obj.get()
-                if product.count < basket_obj.count + count:
-                    return Response('too many goods', status=500)
-
-                basket_obj.count += count
-                basket_obj.save()
-
-            else:
-                if product.count < count:
-                    return Response('too many goods', status=500)
-                BasketItem.objects.create(
-                    user=user,
-                    product=product,
-                    count=count
-                )
+            if not add_to_basket(user.id, product.id, count):
+                return Response('too many goods', status=500)
 
         else:
 
-            old_data: str | None = request.session.get('basket')
-            product_id = str(data['id'])
-            total = data['count']
-            data = {product_id: total}
-
-            if product.count < total:
+            basket_key = get_basket_key(request, create=True)
+            try:
+                total = get_basket_storage().add(
+                    basket_key, product.id, count, limit=product.count
+                )
+            except BasketBusy:
+                return basket_busy()
+            if total is None:
                 return Response('too many goods', status=500)
-
-            if old_data:
-                old_data: dict = json.loads(old_data)
-                total += old_data.get(product_id, 0)
-
-                if product.count < total:
-                    return Response('too many goods', status=500)
-
-                data = old_data.copy()
-                data[product_id] = total
-
-            json_data = json.dumps(data)
-            request.session['basket'] = json_data
         return self.get(request=request)
 
     def get(self, request):
         user = request.user
         if user.is_authenticated:
-            basket_objects = BasketItem.objects.filter(user=user)
-            data = (
+            rows = list(
                 Product.objects
-                .annotate(Count('review'))
-                .prefetch_related(Prefetch(lookup='basket', queryset=basket_objects))
-                .prefetch_related('tags')
-                .prefetch_related('product_image')
                 .filter(basket__user=user)
+                .annotate(in_basket=F('basket__count'))
+                .values(*PRODUCT_CARD_FIELDS, 'in_basket')
             )
-            serializer = BasketSerializer(data, many=True)
-            return Response(serializer.data, status=200)
+            in_basket = {row['id']: row['in_basket'] for row in rows}
+            cards = product_cards(rows)
+            for card in cards:
+                # the count in the basket replaces the stock, as the last key
+                del card['count']
+                card['count'] = in_basket[card['id']]
+            return Response(cards, status=200)
 
         else:
 
-            json_data: str | None = request.session.get('basket')
-            if not json_data:
+            basket_key = get_basket_key(request)
+            data = get_basket_storage().get_items(basket_key) if basket_key else {}
+            if not data:
                 return Response('', status=200)
-            data: dict = json.loads(json_data)
-            products = map(int, data.keys())
-            queryset = (
-                Product.objects
-                .annotate(Count('review'))
-                .prefetch_related('tags')
-                .prefetch_related('product_image')
-                .filter(id__in=products)
+            cards = product_cards(
+                Product.objects.filter(id__in=data).values(*PRODUCT_CARD_FIELDS)
             )
-            for item in queryset:
-                item.count_in_basket = data[str(item.id)]
-            serializer = AnonymBasket(queryset, many=True)
-            return Response(serializer.data, status=200)
+            for card in cards:
+                card['count'] = data[card['id']]
+            return Response(cards, status=200)
 
     def delete(self, request):
 
@@ -121,20 +99,59 @@ class BasketAPIView(APIView):
 
         else:
 
-            product_id = str(data['id'])
-            count = data['count']
-
-            data: str | None = request.session.get('basket')
-            if not data:
+            basket_key = get_basket_key(request)
+            if not basket_key:
                 return Response('miss data', status=500)
 
-            data: dict = json.loads(data)
+            try:
+                get_basket_storage().remove(basket_key, product.id, count)
+            except BasketBusy:
+                return basket_busy()
+        return self.get(request=request)
 
-            if data[product_id] > count:
-                data[product_id] -= count
-            else:
-                data.pop(product_id)
 
-            json_data = json.dumps(data)
-            request.session['basket'] = json_data
-        return self.get(request=request)
+class BasketSummaryAPIView(APIView):
+    """
+    Totals of the basket computed by one aggregate query:
+    number of products, quantity, subtotal at today's prices and
+    whether every product is delivered for free.
+    """
+    query_budget = 3
+
+    def get(self, request):
+        user = request.user
+        if user.is_authenticated:
+            queryset = BasketItem.objects.filter(user=user)
+            quantity = F('count')
+            price = current_price('product_id', 'product__price')
+            free_delivery = Q(product__free_delivery=True)
+        else:
+            basket_key = get_basket_key(request)
+            items = get_basket_storage().get_items(basket_key) if basket_key else {}
+            queryset = Product.objects.filter(id__in=items)
+            quantity = Case(
+                *[When(pk=product_id, then=count) for product_id, count in items.items()],
+                default=0,
+                output_field=IntegerField()
+            )
+            price = current_price()
+            free_delivery = Q(free_delivery=True)
+
+        summary = queryset.aggregate(
+            item_count=Count('pk'),
+            total_quantity=Coalesce(Sum(quantity), 0),
+            subtotal=Coalesce(
+                Sum(quantity * price, output_field=DecimalField()), 0,
+                output_field=DecimalField()
+            ),
+            free_delivery_count=Count('pk', filter=free_delivery),
+        )
+        return Response({
+            'itemCount': summary['item_count'],
+            'totalQuantity': summary['total_quantity'],
+            'subtotal': round(float(summary['subtotal']), 2),
+            'freeDelivery': (
+                summary['item_count'] > 0
+                and summary['free_delivery_count'] == summary['item_count']
+            ),
+        }, status=200)
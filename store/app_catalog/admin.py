@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from app_catalog.models import CatalogItem, Image
+from app_catalog.models import CatalogItem, Image, RankedList
 
 class ImageInline(admin.TabularInline):
     model = Image
@@ -16,3 +16,8 @@ class CatalogItemAdmin(admin.ModelAdmin):
 @admin.register(Image)
 class ImageAdmin(admin.ModelAdmin):
     list_display = 'id', 'src', 'alt',
+
+
+@admin.register(RankedList)
+class RankedListAdmin(admin.ModelAdmin):
+    list_display = 'id', 'name', 'category', 'stale', 'updated_at',
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AppCatalogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app_catalog'
+
+    def ready(self):
+        from . import checks  # noqa: F401
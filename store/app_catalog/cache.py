@@ -0,0 +1,97 @@
+"""
+Versioned cache for almost static catalog data (categories, tags, banners).
+
+Values live in a configurable Django cache backend shared by all workers,
+with a small per-process LRU in front of it. Every value is stored under the
+current version number, so bumping the version from the save/delete signals
+invalidates everything at once in every process. That takes a backend
+shared by the workers and commands (CATALOG_CACHE['ALIAS']), the
+app_catalog.W001 check warns about a local memory one.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+class VersionedCache:
+
+    def __init__(self, namespace, alias='default', local_maxsize=64, timeout=3600):
+        self.namespace = namespace
+        self.alias = alias
+        self.local_maxsize = local_maxsize
+        self.timeout = timeout
+        self.version_key = f'{namespace}:version'
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0}
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def get_version(self):
+        version = self.shared.get(self.version_key)
+        if version is None:
+            # unique start value: an evicted version never comes back
+            self.shared.add(self.version_key, time.time_ns(), timeout=None)
+            version = self.shared.get(self.version_key)
+        return version
+
+    def bump(self):
+        try:
+            self.shared.incr(self.version_key)
+        except ValueError:
+            self.shared.add(self.version_key, time.time_ns(), timeout=None)
+
+    def bump_on_commit(self):
+        """
+        Bump now for this process and once more after commit, so that other
+        workers cannot cache data read before the transaction was committed.
+        """
+        self.bump()
+        transaction.on_commit(self.bump)
+
+    def get_or_set(self, key, builder):
+        version = self.get_version()
+        local_key = (version, key)
+
+        with self._lock:
+            if local_key in self._local:
+                self._local.move_to_end(local_key)
+                self._stats['local_hits'] += 1
+                return self._local[local_key]
+
+        shared_key = f'{self.namespace}:{key}'
+        value = self.shared.get(shared_key, version=version)
+        if value is None:
+            value = builder()
+            self.shared.set(shared_key, value, timeout=self.timeout, version=version)
+            stat = 'misses'
+        else:
+            stat = 'shared_hits'
+
+        with self._lock:
+            self._stats[stat] += 1
+            self._local[local_key] = value
+            while len(self._local) > self.local_maxsize:
+                self._local.popitem(last=False)
+        return value
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['local_size'] = len(self._local)
+        stats['version'] = self.get_version()
+        return stats
+
+
+catalog_cache = VersionedCache(
+    namespace='catalog',
+    alias=settings.CATALOG_CACHE['ALIAS'],
+    local_maxsize=settings.CATALOG_CACHE['LOCAL_MAXSIZE'],
+    timeout=settings.CATALOG_CACHE['TIMEOUT'],
+)
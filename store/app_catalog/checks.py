@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+from store.checks import is_local_memory
+
+
+@register()
+def check_catalog_cache(app_configs, **kwargs):
+    """Versions bumped by one process must be seen by all of them"""
+    alias = settings.CATALOG_CACHE['ALIAS']
+    if is_local_memory(alias):
+        return [Warning(
+            f"The catalog cache is kept in the local memory cache '{alias}'.",
+            hint=(
+                'Changes made by the other workers and by the management commands '
+                'leave categories, tags and banners stale up to TIMEOUT: set '
+                'DJANGO_CACHE_BACKEND to a shared cache (e.g. RedisCache).'
+            ),
+            id='app_catalog.W001',
+        )]
+    return []
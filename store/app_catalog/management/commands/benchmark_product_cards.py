@@ -0,0 +1,53 @@
+import timeit
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from app_catalog.serializers import (
+    PRODUCT_CARD_FIELDS, ProductSerializerForCatalog, product_cards
+)
+from app_products.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the product cards of ProductSerializerForCatalog and of '
+        'product_cards on the stored products, queries included'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, default=100, help='Number of product cards per run'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=20, help='Runs of each way, the best one counts'
+        )
+
+    def handle(self, *args, **options):
+        products = Product.objects.order_by('id')
+        limit = options['limit']
+        size = products[:limit].count()
+        if not size:
+            raise CommandError('There are no products to serialize')
+
+        def serializer():
+            queryset = products.prefetch_related('tags', 'product_image')[:limit]
+            return ProductSerializerForCatalog(queryset, many=True).data
+
+        def cards():
+            return product_cards(products.values(*PRODUCT_CARD_FIELDS)[:limit])
+
+        renderer = JSONRenderer()
+        if renderer.render(cards()) != renderer.render(serializer()):
+            raise CommandError('product_cards output differs from ProductSerializerForCatalog')
+
+        results = {}
+        for name, function in (('ProductSerializerForCatalog', serializer), ('product_cards', cards)):
+            best = min(timeit.repeat(function, number=1, repeat=options['repeat']))
+            results[name] = best / size * 1e6
+            self.stdout.write(f'{name}: {results[name]:.1f} µs per card')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{size} cards, product_cards is '
+            f'{results["ProductSerializerForCatalog"] / results["product_cards"]:.1f}x faster'
+        ))
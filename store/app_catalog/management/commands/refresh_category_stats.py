@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app_catalog.models import CatalogItem, refresh_category_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the precomputed product aggregates of every category'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            refresh_category_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f'Refreshed stats of {CatalogItem.objects.count()} categories'
+        ))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app_catalog.rankings import refresh_rankings
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored lists of popular and limited products'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--no-categories', action='store_true',
+            help='Refresh only the lists over all products'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            refreshed = refresh_rankings(with_categories=not options['no_categories'])
+        self.stdout.write(self.style.SUCCESS(f'Refreshed {refreshed} ranked lists'))
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.6 on 2026-10-18 17:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_closure(apps, schema_editor):
+    CatalogItem = apps.get_model('app_catalog', 'CatalogItem')
+    CatalogItemClosure = apps.get_model('app_catalog', 'CatalogItemClosure')
+
+    parents = dict(CatalogItem.objects.values_list('id', 'parent_category_id'))
+    rows = []
+    for item_id in parents:
+        ancestor_id, depth = item_id, 0
+        while ancestor_id in parents and depth <= len(parents):
+            rows.append(CatalogItemClosure(
+                ancestor_id=ancestor_id, descendant_id=item_id, depth=depth
+            ))
+            ancestor_id, depth = parents[ancestor_id], depth + 1
+    CatalogItemClosure.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_catalog', '0004_alter_image_catalog_item'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogItemClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveSmallIntegerField(verbose_name='depth')),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='app_catalog.catalogitem')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='app_catalog.catalogitem')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['descendant', 'depth'], name='app_catalog_descend_7635eb_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='catalogitemclosure',
+            constraint=models.UniqueConstraint(fields=('ancestor', 'descendant'), name='unique_catalog_path'),
+        ),
+        migrations.RunPython(build_closure, migrations.RunPython.noop),
+    ]
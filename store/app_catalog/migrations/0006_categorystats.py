@@ -0,0 +1,71 @@
+# Generated by Django 4.2.6 on 2026-10-18 17:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Min, Q
+
+
+def fill_category_stats(apps, schema_editor):
+    CatalogItem = apps.get_model('app_catalog', 'CatalogItem')
+    CategoryStats = apps.get_model('app_catalog', 'CategoryStats')
+
+    subtree_product = 'descendant_links__descendant__product'
+    subtree = {
+        row[0]: row[1:] for row in
+        CatalogItem.objects
+        .annotate(
+            subtree_min_price=Min(f'{subtree_product}__price'),
+            subtree_product_count=Count(subtree_product),
+            subtree_in_stock_count=Count(
+                subtree_product, filter=Q(**{f'{subtree_product}__count__gt': 0})
+            ),
+        )
+        .values_list(
+            'id', 'subtree_min_price', 'subtree_product_count', 'subtree_in_stock_count'
+        )
+    }
+    direct = (
+        CatalogItem.objects
+        .annotate(
+            min_price=Min('product__price'),
+            product_count=Count('product'),
+            in_stock_count=Count('product', filter=Q(product__count__gt=0)),
+        )
+        .values_list('id', 'min_price', 'product_count', 'in_stock_count')
+    )
+    CategoryStats.objects.bulk_create([
+        CategoryStats(
+            category_id=category_id,
+            min_price=min_price,
+            product_count=product_count,
+            in_stock_count=in_stock_count,
+            subtree_min_price=subtree[category_id][0],
+            subtree_product_count=subtree[category_id][1],
+            subtree_in_stock_count=subtree[category_id][2],
+        )
+        for category_id, min_price, product_count, in_stock_count in direct
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_catalog', '0005_catalogitemclosure'),
+        ('app_products', '0012_product_rating_sum'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryStats',
+            fields=[
+                ('category', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='stats', serialize=False, to='app_catalog.catalogitem')),
+                ('min_price', models.DecimalField(decimal_places=2, max_digits=10, null=True, verbose_name='min price')),
+                ('product_count', models.PositiveIntegerField(default=0, verbose_name='products')),
+                ('in_stock_count', models.PositiveIntegerField(default=0, verbose_name='products in stock')),
+                ('subtree_min_price', models.DecimalField(decimal_places=2, max_digits=10, null=True, verbose_name='min price in subtree')),
+                ('subtree_product_count', models.PositiveIntegerField(default=0, verbose_name='products in subtree')),
+                ('subtree_in_stock_count', models.PositiveIntegerField(default=0, verbose_name='products in stock in subtree')),
+            ],
+        ),
+        migrations.RunPython(fill_category_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.6 on 2026-10-18 17:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_catalog', '0006_categorystats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RankedList',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=30, verbose_name='name')),
+                ('product_ids', models.JSONField(default=list, verbose_name='product ids')),
+                ('stale', models.BooleanField(default=False, verbose_name='needs refresh')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='updated')),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ranked_lists', to='app_catalog.catalogitem')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='rankedlist',
+            constraint=models.UniqueConstraint(fields=('name', 'category'), name='unique_ranked_list'),
+        ),
+        migrations.AddConstraint(
+            model_name='rankedlist',
+            constraint=models.UniqueConstraint(condition=models.Q(('category', None)), fields=('name',), name='unique_overall_ranked_list'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.6 on 2026-10-18 17:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_catalog', '0007_rankedlist'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict, verbose_name='resized renditions'),
+        ),
+    ]
@@ -1,4 +1,14 @@
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import Count, Min, Q
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from app_catalog.cache import catalog_cache
+from app_media.jobs import enqueue_file_deletion, enqueue_processing
+from app_media.signals import image_stored
+from app_media.variants import PILLOW_FORMATS, needs_variants
+from store.conditional import mark_changed
 
 
 class CatalogItem(models.Model):
@@ -8,9 +18,268 @@ class CatalogItem(models.Model):
         related_name='catalog_item'
     )
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # parent stored in the tree, to notice moves on save
+        instance._tree_parent_id = instance.__dict__.get('parent_category_id')
+        return instance
+
     def __str__(self):
         return self.title[:30]
 
+    def clean(self):
+        if self.pk and self.parent_category_id and (
+            CatalogItemClosure.objects
+            .filter(ancestor=self, descendant_id=self.parent_category_id)
+            .exists()
+        ):
+            raise ValidationError(
+                {'parent_category': 'A category cannot be placed inside its own subtree'}
+            )
+
+
+class CatalogItemClosure(models.Model):
+    """
+    Closure table of the category tree: one row for every
+    (ancestor, descendant) pair, including the node itself with depth 0.
+    """
+    ancestor = models.ForeignKey(
+        CatalogItem, on_delete=models.CASCADE, related_name='descendant_links'
+    )
+    descendant = models.ForeignKey(
+        CatalogItem, on_delete=models.CASCADE, related_name='ancestor_links'
+    )
+    depth = models.PositiveSmallIntegerField(verbose_name='depth')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['ancestor', 'descendant'], name='unique_catalog_path'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['descendant', 'depth']),
+        ]
+
+
+def subtree_ids(category_id):
+    """Subquery with ids of the category and all of its subcategories"""
+    return (
+        CatalogItemClosure.objects
+        .filter(ancestor_id=category_id)
+        .values('descendant_id')
+    )
+
+
+def attach_subtree(node, parent_id):
+    """Link every node of the subtree of ``node`` to ``parent_id`` and its ancestors"""
+    subtree = list(
+        CatalogItemClosure.objects
+        .filter(ancestor=node)
+        .values_list('descendant_id', 'depth')
+    )
+    ancestors = list(
+        CatalogItemClosure.objects
+        .filter(descendant_id=parent_id)
+        .values_list('ancestor_id', 'depth')
+    )
+    CatalogItemClosure.objects.bulk_create([
+        CatalogItemClosure(
+            ancestor_id=ancestor_id,
+            descendant_id=descendant_id,
+            depth=ancestor_depth + descendant_depth + 1
+        )
+        for ancestor_id, ancestor_depth in ancestors
+        for descendant_id, descendant_depth in subtree
+    ])
+
+
+def detach_subtree(node):
+    """Unlink the subtree of ``node`` from all ancestors of ``node``"""
+    (
+        CatalogItemClosure.objects
+        .filter(descendant__in=subtree_ids(node.pk))
+        .exclude(ancestor__in=subtree_ids(node.pk))
+        .delete()
+    )
+
+
+class CategoryStats(models.Model):
+    """
+    Precomputed product aggregates of a category,
+    for the category alone and for its whole subtree.
+    """
+    # rows are removed by refresh_parent_stats, after products of the category:
+    # their post_delete receivers write the stats of the category again
+    category = models.OneToOneField(
+        CatalogItem, on_delete=models.DO_NOTHING, db_constraint=False,
+        primary_key=True, related_name='stats'
+    )
+    min_price = models.DecimalField(
+        verbose_name='min price', max_digits=10, decimal_places=2, null=True
+    )
+    product_count = models.PositiveIntegerField(verbose_name='products', default=0)
+    in_stock_count = models.PositiveIntegerField(verbose_name='products in stock', default=0)
+    subtree_min_price = models.DecimalField(
+        verbose_name='min price in subtree', max_digits=10, decimal_places=2, null=True
+    )
+    subtree_product_count = models.PositiveIntegerField(
+        verbose_name='products in subtree', default=0
+    )
+    subtree_in_stock_count = models.PositiveIntegerField(
+        verbose_name='products in stock in subtree', default=0
+    )
+
+
+def refresh_category_stats(category_ids=None):
+    """
+    Recompute the stats of the given categories and all of their ancestors,
+    or of every category when no ids are given.
+    """
+    categories = CatalogItem.objects.all()
+    if category_ids is not None:
+        category_ids = [category_id for category_id in category_ids if category_id]
+        if not category_ids:
+            return
+        categories = categories.filter(id__in=(
+            CatalogItemClosure.objects
+            .filter(descendant__in=category_ids)
+            .values('ancestor_id')
+        ))
+
+    in_stock = Q(product__count__gt=0)
+    direct = (
+        categories
+        .annotate(
+            min_price=Min('product__price'),
+            product_count=Count('product'),
+            in_stock_count=Count('product', filter=in_stock),
+        )
+        .values_list('id', 'min_price', 'product_count', 'in_stock_count')
+    )
+    subtree_product = 'descendant_links__descendant__product'
+    subtree = dict(
+        (row[0], row[1:]) for row in
+        categories
+        .annotate(
+            subtree_min_price=Min(f'{subtree_product}__price'),
+            subtree_product_count=Count(subtree_product),
+            subtree_in_stock_count=Count(
+                subtree_product, filter=Q(**{f'{subtree_product}__count__gt': 0})
+            ),
+        )
+        .values_list(
+            'id', 'subtree_min_price', 'subtree_product_count', 'subtree_in_stock_count'
+        )
+    )
+
+    CategoryStats.objects.bulk_create(
+        [
+            CategoryStats(
+                category_id=category_id,
+                min_price=min_price,
+                product_count=product_count,
+                in_stock_count=in_stock_count,
+                subtree_min_price=subtree[category_id][0],
+                subtree_product_count=subtree[category_id][1],
+                subtree_in_stock_count=subtree[category_id][2],
+            )
+            for category_id, min_price, product_count, in_stock_count in direct
+        ],
+        update_conflicts=True,
+        unique_fields=['category'],
+        update_fields=[
+            'min_price', 'product_count', 'in_stock_count',
+            'subtree_min_price', 'subtree_product_count', 'subtree_in_stock_count',
+        ],
+    )
+    # banners are cached with the min price of their category
+    catalog_cache.bump_on_commit()
+    mark_changed(CategoryStats)
+
+
+class RankedList(models.Model):
+    """
+    Stored top of products ("popular", "limited"), overall or inside the
+    subtree of a category. Filled by app_catalog.rankings.
+    """
+    name = models.CharField(verbose_name='name', max_length=30)
+    category = models.ForeignKey(
+        CatalogItem, on_delete=models.CASCADE, blank=True, null=True,
+        related_name='ranked_lists'
+    )
+    product_ids = models.JSONField(verbose_name='product ids', default=list)
+    stale = models.BooleanField(verbose_name='needs refresh', default=False)
+    updated_at = models.DateTimeField(verbose_name='updated', auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'category'], name='unique_ranked_list'
+            ),
+            models.UniqueConstraint(
+                fields=['name'], condition=Q(category=None),
+                name='unique_overall_ranked_list'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name}: {self.category_id or "all"}'
+
+
+def mark_rankings_stale(category_ids=None, names=None):
+    """
+    Ask for a refresh of the overall lists and of the given categories,
+    only of the lists called ``names`` when given.
+    """
+    category_filter = Q(category=None)
+    if category_ids:
+        category_filter |= Q(category__in=(
+            CatalogItemClosure.objects
+            .filter(descendant__in=category_ids)
+            .values('ancestor_id')
+        ))
+    ranked_lists = RankedList.objects.filter(category_filter)
+    if names is not None:
+        ranked_lists = ranked_lists.filter(name__in=names)
+    ranked_lists.update(stale=True)
+
+
+@receiver(post_save, sender=CatalogItem)
+def update_catalog_tree(sender, instance, created, **kwargs):
+    if created:
+        CatalogItemClosure.objects.create(
+            ancestor=instance, descendant=instance, depth=0
+        )
+        if instance.parent_category_id:
+            attach_subtree(instance, instance.parent_category_id)
+
+    elif instance.parent_category_id != getattr(instance, '_tree_parent_id', -1):
+        detach_subtree(instance)
+        if instance.parent_category_id:
+            attach_subtree(instance, instance.parent_category_id)
+        # subtree stats of the old and the new ancestors
+        refresh_category_stats([
+            getattr(instance, '_tree_parent_id', None), instance.pk
+        ])
+
+    instance._tree_parent_id = instance.parent_category_id
+
+
+@receiver(pre_delete, sender=CatalogItem)
+def remove_from_catalog_tree(sender, instance, **kwargs):
+    # subcategories become roots, the rows of the node itself are cascaded
+    for child in CatalogItem.objects.filter(parent_category=instance):
+        detach_subtree(child)
+    instance._stats_parent_id = instance.parent_category_id
+
+
+@receiver(post_delete, sender=CatalogItem)
+def refresh_parent_stats(sender, instance, **kwargs):
+    CategoryStats.objects.filter(category_id=instance.pk).delete()
+    refresh_category_stats([getattr(instance, '_stats_parent_id', None)])
+
 
 def image_dir_path(instance, filename):
     return f'images/catalog_items/{filename}'
@@ -27,3 +296,29 @@ class Image(models.Model):
         CatalogItem, on_delete=models.CASCADE,
         blank=True, null=True, related_name='item_image'
     )
+    variants = models.JSONField(verbose_name='resized renditions', default=dict, blank=True)
+
+
+@receiver(post_save, sender=Image)
+def queue_image_processing(sender, instance, **kwargs):
+    if needs_variants(instance):
+        enqueue_processing(instance)
+
+
+@receiver(post_delete, sender=Image)
+def delete_image_variants(sender, instance, **kwargs):
+    enqueue_file_deletion([
+        path
+        for extension in PILLOW_FORMATS
+        for path in (instance.variants or {}).get(extension, {}).values()
+    ])
+
+
+@receiver(post_save, sender=CatalogItem)
+@receiver(post_delete, sender=CatalogItem)
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Image)
+@receiver(image_stored, sender=Image)
+def invalidate_catalog_cache(sender, **kwargs):
+    catalog_cache.bump_on_commit()
+    mark_changed(sender)
@@ -0,0 +1,88 @@
+"""
+Ranked lists of products for the main page ("popular", "limited").
+
+The ids of the top products are stored in RankedList rows, refreshed by the
+refresh_rankings command (e.g. from cron) and lazily when a list is older
+than RANKINGS['TTL'] or was marked stale by a write. Requests only load the
+stored ids and hydrate the products with one ``id__in`` query.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from app_catalog.models import CatalogItem, RankedList, subtree_ids
+from app_products.models import Product
+
+# stock counts of the products in the "limited" list
+LIMITED_COUNTS = (1, 2, 3)
+
+RANKINGS = {
+    'popular': lambda products: products.order_by('-rating', '-sold', 'id'),
+    'limited': lambda products: products.filter(count__in=LIMITED_COUNTS).order_by('id'),
+}
+
+
+def rank_products(name, category_id=None):
+    products = Product.objects.all()
+    if category_id is not None:
+        products = products.filter(category__in=subtree_ids(category_id))
+    products = RANKINGS[name](products)
+    return list(products.values_list('id', flat=True)[:settings.RANKINGS['SIZE']])
+
+
+def refresh_ranking(name, category_id=None):
+    """Store the ranked list, CatalogItem.DoesNotExist for an unknown category"""
+    product_ids = rank_products(name, category_id)
+    if (
+        not product_ids and category_id is not None
+        and not CatalogItem.objects.filter(pk=category_id).exists()
+    ):
+        # no list is stored for categories which do not exist
+        raise CatalogItem.DoesNotExist(f'No category {category_id}')
+    ranked_list, _ = RankedList.objects.update_or_create(
+        name=name, category_id=category_id,
+        defaults={
+            'product_ids': product_ids,
+            'stale': False,
+        }
+    )
+    return ranked_list
+
+
+def refresh_rankings(with_categories=True):
+    """Refresh every overall list and, optionally, the lists of every category"""
+    category_ids = [None]
+    if with_categories:
+        category_ids += list(CatalogItem.objects.values_list('id', flat=True))
+
+    for category_id in category_ids:
+        for name in RANKINGS:
+            refresh_ranking(name, category_id)
+    return len(category_ids) * len(RANKINGS)
+
+
+def get_ranking(name, category_id=None):
+    ranked_list = (
+        RankedList.objects
+        .filter(name=name, category_id=category_id)
+        .first()
+    )
+    expired = timezone.now() - timedelta(seconds=settings.RANKINGS['TTL'])
+    if ranked_list is None or ranked_list.stale or ranked_list.updated_at < expired:
+        ranked_list = refresh_ranking(name, category_id)
+    return ranked_list.product_ids
+
+
+def get_ranked_products(name, category_id=None, queryset=None):
+    """Products (or ``.values()`` rows of them) of a ranked list in rank order"""
+    product_ids = get_ranking(name, category_id)
+    if queryset is None:
+        queryset = Product.objects.all()
+    position = {product_id: index for index, product_id in enumerate(product_ids)}
+    products = queryset.filter(id__in=product_ids)
+
+    def rank(product):
+        return position[product['id'] if isinstance(product, dict) else product.id]
+
+    return sorted(products, key=rank)
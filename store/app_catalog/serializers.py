@@ -1,15 +1,23 @@
+from collections import defaultdict
+
+from django.core.files.storage import default_storage
+from django.utils import timezone
 from rest_framework import serializers
-from .models import CatalogItem, Image
-from app_products.serializers import TagsSerializer
+from .models import CatalogItem, CategoryStats, Image
+from app_products.serializers import TagsSerializer, default_image
 from app_products.serializers import ImageSerializer as ImageProdSerializer
 from app_products.models import Product
+from app_products.models import Image as ProductImage
+from app_media.serializers import SrcsetField
+from app_media.variants import PILLOW_FORMATS, build_srcset
 
 
 class ImageSerializer(serializers.ModelSerializer):
+    srcset = SrcsetField()
 
     class Meta:
         model = Image
-        fields = ['src', 'alt']
+        fields = ['src', 'alt', 'srcset']
 
 
 class CatalogItemSerializer(serializers.ModelSerializer):
@@ -24,10 +32,17 @@ class CatalogItemSerializer(serializers.ModelSerializer):
         ]
 
     def get_catalog_item(self, instance):
-        if instance.catalog_item.exists():
-            children_serializer = CatalogItemSerializer(instance.catalog_item, many=True)
-            return children_serializer.data
-        return []
+        # the whole tree may be loaded at once and grouped by parent
+        subcategories = self.context.get('subcategories')
+        if subcategories is not None:
+            children = subcategories.get(instance.id, [])
+        else:
+            children = instance.catalog_item.all()
+
+        children_serializer = CatalogItemSerializer(
+            children, many=True, context=self.context
+        )
+        return children_serializer.data
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
@@ -51,7 +66,7 @@ class ProductSerializerForCatalog(serializers.ModelSerializer):
         ]
 
     def get_reviews(self, instance):
-        return instance.review__count
+        return instance.review_count
 
     def to_representation(self, instance):
 
@@ -69,6 +84,85 @@ class ProductSerializerForCatalog(serializers.ModelSerializer):
         return representation
 
 
+PRODUCT_CARD_FIELDS = (
+    'id', 'price', 'count', 'date', 'title', 'description',
+    'free_delivery', 'rating', 'review_count', 'category',
+)
+PRODUCT_CARD_DATE_FORMAT = '%a %b %d %Y %H:%M:%S GMT%z (%Z)'
+
+
+def product_card_relations(product_ids, request=None):
+    """Tags and images of the products by product id, with two queries"""
+    tags = defaultdict(list)
+    for product_id, tag_id, name in (
+        Product.tags.through.objects
+        .filter(product_id__in=product_ids)
+        .order_by('id')
+        .values_list('product_id', 'tag_id', 'tag__name')
+    ):
+        tags[product_id].append({'id': tag_id, 'name': name})
+
+    images = defaultdict(list)
+    for product_id, src, alt, variants in (
+        ProductImage.objects
+        .filter(product_id__in=product_ids)
+        .order_by('id')
+        .values_list('product_id', 'src', 'alt', 'variants')
+    ):
+        url = default_storage.url(src) if src else None
+        if url is not None and request is not None:
+            url = request.build_absolute_uri(url)
+        images[product_id].append({
+            'src': url,
+            'alt': alt,
+            'srcset': {
+                extension: build_srcset(variants, extension, request)
+                for extension in PILLOW_FORMATS
+                if (variants or {}).get(extension)
+            },
+        })
+    return tags, images
+
+
+def product_cards(rows, request=None):
+    """
+    Same cards as ProductSerializerForCatalog, key order included, built
+    from ``.values(*PRODUCT_CARD_FIELDS)`` rows without serializer fields.
+    """
+    rows = list(rows)
+    tags, images = product_card_relations([row['id'] for row in rows], request)
+    current_timezone = timezone.get_current_timezone()
+    cards = []
+    for row in rows:
+        description = row['description']
+        card = {
+            'id': row['id'],
+            'count': row['count'],
+            'date': row['date'].astimezone(current_timezone).strftime(PRODUCT_CARD_DATE_FORMAT),
+            'title': row['title'],
+            'tags': tags[row['id']],
+            'images': images[row['id']] or [default_image(request)],
+            'reviews': row['review_count'],
+            'category': row['category'],
+            'price': float(row['price']),
+            'fullDescription': description,
+        }
+        if len(description) > 20:
+            card['description'] = description[:20] + '...'
+        card['freeDelivery'] = row['free_delivery']
+        card['rating'] = float(row['rating'])
+        cards.append(card)
+    return cards
+
+
+def get_min_price(category):
+    try:
+        min_price = category.stats.min_price
+    except CategoryStats.DoesNotExist:
+        return None
+    return None if min_price is None else float(min_price)
+
+
 class BannerSerializer(serializers.Serializer):
     item_image = ImageSerializer()
 
@@ -83,6 +177,6 @@ class BannerSerializer(serializers.Serializer):
         representation['images'] = [representation.pop('item_image')]
         representation['id'] = instance.id
         representation['title'] = instance.title
-        representation['price'] = instance.product__price__min
+        representation['price'] = get_min_price(instance)
         representation['category'] = instance.id
         return representation
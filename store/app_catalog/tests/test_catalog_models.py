@@ -1,9 +1,13 @@
 import os
 
+from django.core.exceptions import ValidationError
 from django.core.files.uploadedfile import SimpleUploadedFile
 from rest_framework.test import APITestCase
 
-from app_catalog.models import CatalogItem, Image
+from app_catalog.models import (
+    CatalogItem, CatalogItemClosure, CategoryStats, Image, subtree_ids
+)
+from app_products.models import Product
 
 
 class CatalogTest(APITestCase):
@@ -55,3 +59,78 @@ class CatalogTest(APITestCase):
         """Test to check path to new image file"""
         expected_path = f'images/catalog_items/test.png'
         self.assertEqual(self.image.src.name, expected_path)
+
+    def test_catalog_tree_closure(self):
+        """Test that the closure table follows creation, moving and deletion of categories"""
+        def ancestors(item):
+            return dict(
+                CatalogItemClosure.objects
+                .filter(descendant=item)
+                .values_list('ancestor_id', 'depth')
+            )
+
+        grandchild = CatalogItem.objects.create(
+            title='Grandchild Catalog Item',
+            parent_category=self.child
+        )
+        self.assertEqual(
+            ancestors(grandchild),
+            {grandchild.id: 0, self.child.id: 1, self.parent.id: 2}
+        )
+
+        other = CatalogItem.objects.create(title='Other Catalog Item')
+        child = CatalogItem.objects.get(pk=self.child.pk)
+        child.parent_category = other
+        child.save()
+        self.assertEqual(
+            ancestors(grandchild),
+            {grandchild.id: 0, child.id: 1, other.id: 2}
+        )
+        self.assertEqual(
+            set(subtree_ids(self.parent.id).values_list('descendant_id', flat=True)),
+            {self.parent.id}
+        )
+
+        child.parent_category = grandchild
+        with self.assertRaises(ValidationError):
+            child.clean()
+
+        other.delete()
+        self.assertEqual(ancestors(grandchild), {grandchild.id: 0, child.id: 1})
+
+    def test_category_stats(self):
+        """Test that category stats follow product changes and category moves"""
+        def stats(item):
+            return CategoryStats.objects.values(
+                'min_price', 'product_count', 'in_stock_count',
+                'subtree_min_price', 'subtree_product_count', 'subtree_in_stock_count',
+            ).get(category=item)
+
+        category = CatalogItem.objects.create(title='Stats Catalog Item')
+        subcategory = CatalogItem.objects.create(
+            title='Stats Subcategory', parent_category=category
+        )
+        cheap = Product.objects.create(
+            title='Cheap', description='Cheap product', price=5, count=0, rating=0,
+            category=subcategory
+        )
+        Product.objects.create(
+            title='Expensive', description='Expensive product', price=50, count=3, rating=0,
+            category=category
+        )
+        self.assertEqual(stats(category), {
+            'min_price': 50, 'product_count': 1, 'in_stock_count': 1,
+            'subtree_min_price': 5, 'subtree_product_count': 2,
+            'subtree_in_stock_count': 1,
+        })
+
+        cheap.count = 2
+        cheap.price = 7
+        cheap.save()
+        self.assertEqual(stats(subcategory)['min_price'], 7)
+        self.assertEqual(stats(category)['subtree_in_stock_count'], 2)
+
+        subcategory.parent_category = self.parent
+        subcategory.save()
+        self.assertEqual(stats(category)['subtree_min_price'], 50)
+        self.assertEqual(stats(self.parent)['subtree_min_price'], 7)
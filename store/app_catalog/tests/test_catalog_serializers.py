@@ -1,15 +1,18 @@
 import os
+from io import StringIO
 from types import NoneType
 
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.db.models import Count, Min
-from rest_framework.test import APITestCase
+from django.core.management import call_command
+from django.db.models import Count
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, APITestCase
 
 from app_catalog.models import Image, CatalogItem
-from app_products.models import Product
+from app_products.models import Image as ProductImage, Product, Tag
 from app_catalog.serializers import (
     ImageSerializer, CatalogItemSerializer, ProductSerializerForCatalog,
-    BannerSerializer
+    BannerSerializer, PRODUCT_CARD_FIELDS, product_cards
 )
 
 
@@ -126,12 +129,39 @@ class SerializerTestCase(APITestCase):
         self.assertIsInstance(data[0]['fullDescription'], str)
 
 
+    def test_product_cards(self):
+        """Test that product cards render to the same JSON as ProductSerializerForCatalog"""
+        tags = [Tag.objects.create(name=f'Card tag {number}') for number in range(3)]
+        descriptions = ['Short one', 'A description of more than twenty characters']
+        for number, description in enumerate(descriptions):
+            product = Product.objects.create(
+                title=f'Card product {number}', description=description,
+                price='10.50', count=number, rating='4.5', review_count=number * 3,
+                free_delivery=bool(number), category=self.child_1
+            )
+            product.tags.set(tags[number:])
+        ProductImage.objects.create(
+            src='images/products/card.png', alt='card image', product=product,
+            variants={'webp': {'160': 'images/products/variants/card_160w.webp'}}
+        )
+        queryset = Product.objects.filter(title__startswith='Card product').order_by('id')
+
+        renderer = JSONRenderer()
+        for request in (None, APIRequestFactory().get('/api/catalog')):
+            serializer = ProductSerializerForCatalog(
+                queryset.prefetch_related('tags', 'product_image'),
+                many=True, context={'request': request}
+            )
+            cards = product_cards(queryset.values(*PRODUCT_CARD_FIELDS), request)
+            self.assertEqual(renderer.render(cards), renderer.render(serializer.data))
+
+        out = StringIO()
+        call_command('benchmark_product_cards', repeat=1, stdout=out)
+        self.assertIn('µs per card', out.getvalue())
+
     def test_banner_serializer(self):
         """Test banner fields (in serializer)"""
-        queryset = (
-            CatalogItem.objects
-            .annotate(Min('product__price'))
-        )
+        queryset = CatalogItem.objects.select_related('stats')
         serializer = BannerSerializer(queryset, many=True)
         data = serializer.data
         set_should_be = {
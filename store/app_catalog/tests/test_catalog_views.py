@@ -1,13 +1,22 @@
+import base64
+import json
 import os
+from unittest import mock
 
+from django.core.checks import run_checks
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
 from rest_framework import status
 from rest_framework.test import APITestCase, APIClient
-from app_catalog.models import CatalogItem, Image
-from app_products.models import Product
+from django.contrib.auth.models import User
 
+from app_catalog.cache import catalog_cache
+from app_catalog.models import CatalogItem, Image, RankedList, refresh_category_stats
+from app_products.models import Product, Tag
+from store.testing import QueryBudgetMixin
 
-class CatalogViewSetTest(APITestCase):
+
+class CatalogViewSetTest(QueryBudgetMixin, APITestCase):
 
     @classmethod
     def setUpClass(cls):
@@ -55,7 +64,12 @@ class CatalogViewSetTest(APITestCase):
     def test_categories_view(self):
         """Test categories view"""
 
-        response = self.client.get('/api/categories/')
+        catalog_cache.bump()
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/categories/')
+        # served from the cache
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/categories/').data, response.data)
         data = response.data
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         set_should_be = {
@@ -72,6 +86,64 @@ class CatalogViewSetTest(APITestCase):
         self.assertEqual(len(data[0]['subcategories']), 2)
         self.assertEqual(set(data[0]['subcategories'][0]), set_should_be)
 
+    def test_categories_cache_invalidation(self):
+        """Test that changed categories and images are not served from the cache"""
+        self.client.get('/api/categories/')
+
+        child = CatalogItem.objects.get(pk=self.child_2.pk)
+        child.title = 'Renamed Catalog Item'
+        child.save()
+        response = self.client.get('/api/categories/')
+        titles = [item['title'] for item in response.data[0]['subcategories']]
+        self.assertIn('Renamed Catalog Item', titles)
+
+        image = Image.objects.get(pk=self.image_parent.pk)
+        image.alt = 'changed alt'
+        image.save()
+        response = self.client.get('/api/categories/')
+        self.assertEqual(response.data[0]['image']['alt'], 'changed alt')
+
+    def test_cache_stats_view(self):
+        """Test that the cache counters are available to admins only"""
+        response = self.client.get('/api/cache/stats/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        admin = User.objects.create_superuser(username='admin', password='12345')
+        self.client.force_authenticate(admin)
+        catalog_cache.bump()
+        before = self.client.get('/api/cache/stats/').data
+        self.client.get('/api/categories/')
+        self.client.get('/api/categories/')
+        after = self.client.get('/api/cache/stats/').data
+        self.assertEqual(after['misses'], before['misses'] + 1)
+        self.assertEqual(after['local_hits'], before['local_hits'] + 1)
+        self.client.force_authenticate(None)
+
+    def test_banners_cache_stats_refresh(self):
+        """Test that cached banners show the min price of a stats refresh"""
+        self.addCleanup(catalog_cache.bump)
+        with mock.patch('app_catalog.views.LIST_OF_PROMOTED', [self.child_1.id]):
+            response = self.client.get('/api/banners/')
+            self.assertEqual(response.data[0]['price'], 2.99)
+
+            Product.objects.filter(category=self.child_1).update(price=1)
+            with self.captureOnCommitCallbacks(execute=True):
+                refresh_category_stats([self.child_1.id])
+            response = self.client.get('/api/banners/')
+            self.assertEqual(response.data[0]['price'], 1)
+
+    def test_catalog_cache_check(self):
+        """Test that a catalog cache in the memory of each process is reported"""
+        self.assertIn('app_catalog.W001', [message.id for message in run_checks()])
+        shared = {
+            'default': {
+                'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                'LOCATION': 'redis://127.0.0.1:6379',
+            },
+        }
+        with override_settings(CACHES=shared):
+            self.assertNotIn('app_catalog.W001', [message.id for message in run_checks()])
+
     def test_limited_products_view(self):
         """Test of limited product list"""
 
@@ -148,6 +220,138 @@ class CatalogViewSetTest(APITestCase):
 
         self.assertEqual(data['items'][0]['title'], 'Product for tests #10')
 
+    def test_products_list_category_subtree(self):
+        """Test that filtering by a category includes its subcategories"""
+        params = {
+            'filter[name]': '',
+            'filter[minPrice]': 1,
+            'filter[maxPrice]': 11,
+            'filter[freeDelivery]': 'false',
+            'filter[available]': 'true',
+            'sort': 'price',
+            'sortType': '',
+            'limit': 20,
+        }
+        response = self.client.get(
+            '/api/catalog/', data={**params, 'category': self.parent.id}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['items']), 10)
+
+        response = self.client.get(
+            '/api/catalog/', data={**params, 'category': self.child_1.id}
+        )
+        self.assertEqual(len(response.data['items']), 5)
+        for item in response.data['items']:
+            self.assertEqual(item['category'], self.child_1.id)
+
+    def test_products_list_seek_pagination(self):
+        """Test keyset pagination with a cursor for every sorting"""
+        params = {
+            'filter[name]': '',
+            'filter[minPrice]': 1,
+            'filter[maxPrice]': 11,
+            'filter[freeDelivery]': 'false',
+            'filter[available]': 'true',
+            'sortType': 'dec',
+            'limit': 3,
+        }
+        for sort in ('price', 'rating', 'date', 'reviews'):
+            response = self.client.get(
+                '/api/catalog/', data={**params, 'sort': sort, 'limit': 20}
+            )
+            expected = [item['id'] for item in response.data['items']]
+
+            received = []
+            cursor = ''
+            while cursor is not None:
+                response = self.client.get(
+                    '/api/catalog/', data={**params, 'sort': sort, 'cursor': cursor}
+                )
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(set(response.data), {'items', 'nextCursor'})
+                self.assertLessEqual(len(response.data['items']), 3)
+                received += [item['id'] for item in response.data['items']]
+                cursor = response.data['nextCursor']
+
+            self.assertEqual(len(received), 10)
+            self.assertEqual(received, expected)
+
+        response = self.client.get(
+            '/api/catalog/', data={**params, 'sort': 'price', 'cursor': 'broken'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_products_list_tampered_cursor(self):
+        """Test that cursors with values of other types or lengths are not found"""
+        params = {
+            'filter[name]': '',
+            'filter[minPrice]': 1,
+            'filter[maxPrice]': 11,
+            'filter[freeDelivery]': 'false',
+            'filter[available]': 'true',
+            'sortType': 'dec',
+        }
+        tampered = {
+            'price': (['abc', 1], [1, 'x'], [1, None], [[1], 1], ['NaN', 1], [1]),
+            'date': (['yesterday', 1], [1, 1]),
+        }
+        for sort, cursors in tampered.items():
+            for values in cursors:
+                cursor = base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+                response = self.client.get(
+                    '/api/catalog/', data={**params, 'sort': sort, 'cursor': cursor}
+                )
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, values)
+                self.assertEqual(response.data['detail'], 'Invalid cursor')
+
+    def test_products_list_full_text_search(self):
+        """Test search by description and tags with relevance sorting"""
+        params = {
+            'filter[minPrice]': 1,
+            'filter[maxPrice]': 11,
+            'filter[freeDelivery]': 'false',
+            'filter[available]': 'false',
+            'sort': 'relevance',
+            'sortType': '',
+            'limit': 20,
+        }
+        response = self.client.get(
+            '/api/catalog/', data={**params, 'filter[name]': 'descr'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['items']), 10)
+
+        product_3 = Product.objects.get(title='Product for tests #3')
+        product_7 = Product.objects.get(title='Product for tests #7')
+        tag = Tag.objects.create(name='Waterproof')
+        product_3.tags.add(tag)
+        product_7.tags.add(tag)
+        product_7.title = 'Waterproof product for tests #7'
+        product_7.save()
+
+        response = self.client.get(
+            '/api/catalog/', data={**params, 'filter[name]': 'waterpr'}
+        )
+        titles = [item['title'] for item in response.data['items']]
+        # a match in the title outweighs a match in the tags only
+        self.assertEqual(titles, [product_7.title, product_3.title])
+
+        tag.name = 'Dustproof'
+        tag.save()
+        response = self.client.get(
+            '/api/catalog/', data={**params, 'filter[name]': 'dustproof'}
+        )
+        titles = [item['title'] for item in response.data['items']]
+        self.assertCountEqual(titles, [product_7.title, product_3.title])
+
+        # input without a word matches nothing, not the whole catalog
+        response = self.client.get(
+            '/api/catalog/', data={**params, 'filter[name]': '?!-'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['items'], [])
+
     def test_popular_products_view(self):
         """Test of popular product list"""
 
@@ -167,6 +371,41 @@ class CatalogViewSetTest(APITestCase):
         self.assertIsInstance(product['tags'], list)
         self.assertIsInstance(product['images'], list)
 
+    def test_ranked_lists(self):
+        """Test that popular and limited products come from stored ranked lists"""
+        self.client.get('/api/products/popular/')
+        ranked_list = RankedList.objects.get(name='popular', category=None)
+        self.assertEqual(len(ranked_list.product_ids), 8)
+
+        # the stored order is kept without ranking the products again
+        product_ids = list(reversed(ranked_list.product_ids))
+        RankedList.objects.filter(pk=ranked_list.pk).update(product_ids=product_ids)
+        response = self.client.get('/api/products/popular/')
+        self.assertEqual([product['id'] for product in response.data], product_ids)
+
+        response = self.client.get(
+            '/api/products/limited/', data={'category': self.child_1.id}
+        )
+        self.assertEqual(
+            {product['category'] for product in response.data}, {self.child_1.id}
+        )
+
+        # a write marks the lists stale and the next request refreshes them
+        self.client.get('/api/products/limited/')
+        product = Product.objects.get(count=5)
+        product.count = 1
+        product.save()
+        self.assertTrue(RankedList.objects.get(name='limited', category=None).stale)
+        response = self.client.get('/api/products/limited/')
+        self.assertIn(product.id, [product['id'] for product in response.data])
+
+    def test_ranked_lists_unknown_category(self):
+        """Test that rankings of a category which does not exist are not found"""
+        for path in ('/api/products/popular/', '/api/products/limited/'):
+            response = self.client.get(path, data={'category': 99999})
+            self.assertEqual(response.status_code, 404)
+        self.assertFalse(RankedList.objects.filter(category_id=99999).exists())
+
     def test_banners_view(self):
         """Test of banners view"""
 
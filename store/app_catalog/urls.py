@@ -1,6 +1,7 @@
 from django.urls import path
 from .views import (
-    CatalogListView, CatalogView, LimitedView, PopularView, BannersView
+    CatalogListView, CatalogView, LimitedView, PopularView, BannersView,
+    CacheStatsView,
 )
 
 
@@ -10,4 +11,5 @@ urlpatterns = [
     path('products/limited/', LimitedView.as_view(), name='limited'),
     path('products/popular/', PopularView.as_view(), name='popular'),
     path('banners/', BannersView.as_view(), name='banners'),
+    path('cache/stats/', CacheStatsView.as_view(), name='cache-stats'),
 ]
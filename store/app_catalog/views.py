@@ -1,32 +1,65 @@
+import base64
+import datetime
+import decimal
+import json
 import random
+from collections import defaultdict
 
-from django.db.models import Q, Count, Min
+from django.core.exceptions import ValidationError
+from django.db.models import Q
 
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from rest_framework import generics
 
 from .serializers import (
-    CatalogItemSerializer, ProductSerializerForCatalog, BannerSerializer
+    CatalogItemSerializer, ProductSerializerForCatalog, BannerSerializer,
+    PRODUCT_CARD_FIELDS, product_cards
 )
-from .models import CatalogItem
+from .cache import catalog_cache
+from .models import CatalogItem, subtree_ids
+from .rankings import get_ranked_products
 from app_products.models import Product
+from app_products.search import search_products
+from store.conditional import ConditionalGetMixin
 
 LIST_OF_PROMOTED = [5, 8, 9, 6, 10, 7]
 
 
-class CatalogListView(generics.ListAPIView):
+class CatalogListView(ConditionalGetMixin, generics.ListAPIView):
+    query_budget = 1
+    conditional_models = ('app_catalog.CatalogItem', 'app_catalog.Image')
     serializer_class = CatalogItemSerializer
 
     def get_queryset(self):
         queryset = (
             CatalogItem.objects
-            .filter(parent_category=None)
-            .prefetch_related('catalog_item')
-            .prefetch_related('item_image')
+            .select_related('item_image')
+            .order_by('id')
         )
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        key = f'categories:{request.build_absolute_uri("/")}'
+        return Response(catalog_cache.get_or_set(key, self.build_tree))
+
+    def build_tree(self):
+        """The whole tree is loaded with one query and grouped by parent"""
+        roots = []
+        subcategories = defaultdict(list)
+        for item in self.get_queryset():
+            if item.parent_category_id is None:
+                roots.append(item)
+            else:
+                subcategories[item.parent_category_id].append(item)
+
+        context = self.get_serializer_context()
+        context['subcategories'] = subcategories
+        serializer = self.serializer_class(roots, many=True, context=context)
+        return serializer.data
+
 
 class ListPagination(PageNumberPagination):
     page_size = 4
@@ -42,10 +75,138 @@ class ListPagination(PageNumberPagination):
         })
 
 
-class CatalogView(generics.ListAPIView):
+class SeekPagination(BasePagination):
+    """
+    Keyset pagination over the ordering of the queryset.
+    The opaque cursor holds the ordering values of the last item of the page,
+    the next page continues right after it without OFFSET and COUNT(*).
+    The ordering must end with a unique field (id).
+    """
+    page_size = ListPagination.page_size
+    cursor_query_param = 'cursor'
+    page_size_query_param = ListPagination.page_size_query_param
+    max_page_size = ListPagination.max_page_size
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    @staticmethod
+    def get_ordering(queryset):
+        """(name, descending, model field) of every ordering field"""
+        ordering = []
+        for field in queryset.query.order_by:
+            name = field.lstrip('-')
+            annotation = queryset.query.annotations.get(name)
+            if annotation is not None:
+                model_field = annotation.output_field
+            else:
+                model_field = queryset.model._meta.get_field(name)
+            ordering.append((name, field.startswith('-'), model_field))
+        return ordering
+
+    @staticmethod
+    def encode_value(value):
+        # full precision, values go back into the lookups as they are
+        if isinstance(value, datetime.datetime):
+            return value.isoformat()
+        if isinstance(value, decimal.Decimal):
+            return str(value)
+        raise TypeError(f'Unsupported cursor value {value!r}')
+
+    @staticmethod
+    def decode_value(model_field, value):
+        # the lookups get values of the type of the field, never NULL
+        value = model_field.to_python(value)
+        if value is None:
+            raise ValueError('Empty cursor value')
+        return value
+
+    def encode_cursor(self, item):
+        if isinstance(item, dict):
+            values = [item[field] for field, _, _ in self.ordering]
+        else:
+            values = [getattr(item, field) for field, _, _ in self.ordering]
+        payload = json.dumps(values, default=self.encode_value)
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            return [
+                self.decode_value(model_field, value)
+                for (_, _, model_field), value in zip(self.ordering, values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def seek_filter(self, values):
+        """(a, b) after (x, y) <=> a > x OR (a = x AND b > y)"""
+        condition = Q()
+        equal = Q()
+        for (field, descending, _), value in zip(self.ordering, values):
+            lookup = 'lt' if descending else 'gt'
+            condition |= equal & Q(**{f'{field}__{lookup}': value})
+            equal &= Q(**{field: value})
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(self.seek_filter(self.decode_cursor(cursor)))
+
+        items = list(queryset[:self.page_size + 1])
+        self.has_next = len(items) > self.page_size
+        self.page = items[:self.page_size]
+        return self.page
+
+    def get_next_cursor(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_paginated_response(self, data):
+        return Response({
+            'items': data,
+            'nextCursor': self.get_next_cursor()
+        })
+
+
+class CatalogView(ConditionalGetMixin, generics.ListAPIView):
+    query_budget = 4
+    conditional_models = (
+        'app_catalog.CatalogItem', 'app_products.Product', 'app_products.Tag',
+        'app_products.Specification', 'app_products.Image', 'app_products.Review',
+    )
     pagination_class = ListPagination
+    seek_pagination_class = SeekPagination
     serializer_class = ProductSerializerForCatalog
 
+    @property
+    def paginator(self):
+        """Keyset pagination is used when the request carries a cursor param"""
+        if not hasattr(self, '_paginator'):
+            cursor_param = self.seek_pagination_class.cursor_query_param
+            if cursor_param in self.request.query_params:
+                self._paginator = self.seek_pagination_class()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
     def get_queryset(self):
 
         search = self.request.GET['filter[name]']
@@ -61,21 +222,15 @@ class CatalogView(generics.ListAPIView):
         response_dict = dict(self.request.GET)
         tags = response_dict.get('tags[]')
 
-        query_set = (
-            Product.objects.filter(
-                Q(price__gte=min_price) & Q(price__lte=max_price)
-            )
-
-            .annotate(Count('review'))
-            .prefetch_related('tags')
-            .prefetch_related('product_image')
+        query_set = Product.objects.filter(
+            Q(price__gte=min_price) & Q(price__lte=max_price)
         )
 
         if search:
-            query_set = query_set.filter(title__icontains=search)
+            query_set = search_products(query_set, search)
 
         if category:
-            query_set = query_set.filter(category=category)
+            query_set = query_set.filter(category__in=subtree_ids(category))
 
         if free_delivery == 'true':
             query_set = query_set.filter(free_delivery=True)
@@ -89,7 +244,7 @@ class CatalogView(generics.ListAPIView):
         sorting = 'price'
 
         if sort == 'reviews':
-            sorting = 'review__count'
+            sorting = 'review_count'
         elif sort == 'rating':
             sorting = 'rating'
         elif sort == 'date':
@@ -98,47 +253,87 @@ class CatalogView(generics.ListAPIView):
         if sort_type == 'dec':
             sorting = '-' + sorting
 
-        query_set = query_set.order_by(sorting)
+        ordering = [sorting]
+        fields = PRODUCT_CARD_FIELDS
+        if 'search_rank' in query_set.query.annotations:
+            # bm25 rank, the lower the more relevant
+            if sort == 'relevance':
+                ordering = ['search_rank']
+            else:
+                ordering.append('search_rank')
+            # the cursor of keyset pagination is read from the rows
+            fields += ('search_rank',)
 
-        return query_set
+        # unique tie-breaker for stable pages and keyset pagination
+        ordering.append('id')
+        query_set = query_set.order_by(*ordering)
 
+        return query_set.values(*fields)
 
-class LimitedView(generics.ListAPIView):
+    def list(self, request, *args, **kwargs):
+        # cards are built from the rows, without a serializer per product
+        page = self.paginate_queryset(self.get_queryset())
+        return self.get_paginated_response(product_cards(page, request))
+
+
+class RankedProductsView(generics.ListAPIView):
+    """Products of a stored ranked list, optionally inside a category"""
+    query_budget = 11
     serializer_class = ProductSerializerForCatalog
+    ranking = None
+
+    def get_queryset(self):
+        category = self.request.GET.get('category')
+        category_id = int(category) if category and category.isdigit() else None
+        queryset = Product.objects.values(*PRODUCT_CARD_FIELDS)
+        try:
+            return get_ranked_products(self.ranking, category_id, queryset)
+        except CatalogItem.DoesNotExist:
+            raise NotFound('category not found')
 
-    queryset = (
-        Product.objects
-        .filter(count__in=[1, 2, 3])
-        .annotate(Count('review'))
-        .prefetch_related('tags')
-        .prefetch_related('product_image')
-    )[:8]
+    def list(self, request, *args, **kwargs):
+        return Response(product_cards(self.get_queryset(), request))
 
 
-class PopularView(generics.ListAPIView):
-    serializer_class = ProductSerializerForCatalog
+class LimitedView(RankedProductsView):
+    ranking = 'limited'
 
-    queryset = (
-        Product.objects
 
-        .annotate(Count('review'))
-        .prefetch_related('tags')
-        .prefetch_related('product_image')
-        .order_by('-rating', '-sold')
-    )[:8]
+class PopularView(RankedProductsView):
+    ranking = 'popular'
 
 
-class BannersView(generics.ListAPIView):
+class BannersView(ConditionalGetMixin, generics.ListAPIView):
+    query_budget = 1
+    conditional_models = (
+        'app_catalog.CatalogItem', 'app_catalog.Image', 'app_catalog.CategoryStats',
+    )
     serializer_class = BannerSerializer
 
     def get_queryset(self):
-        promoted = LIST_OF_PROMOTED
-        if len(promoted) > 3:
-            promoted = random.sample(promoted, k=3)
         queryset = (
             CatalogItem.objects
-            .filter(id__in=promoted)
-            .prefetch_related('item_image')
-            .annotate(Min('product__price'))
+            .filter(id__in=LIST_OF_PROMOTED)
+            .select_related('item_image', 'stats')
         )
         return queryset
+
+    def list(self, request, *args, **kwargs):
+        key = f'banners:{request.build_absolute_uri("/")}'
+        banners = catalog_cache.get_or_set(key, self.build_banners)
+        if len(banners) > 3:
+            banners = random.sample(banners, k=3)
+        return Response(banners)
+
+    def build_banners(self):
+        serializer = self.get_serializer(self.get_queryset(), many=True)
+        return serializer.data
+
+
+class CacheStatsView(generics.GenericAPIView):
+    """Hit/miss counters of the catalog cache in this worker process"""
+    query_budget = 1
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(catalog_cache.stats())
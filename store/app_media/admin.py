@@ -0,0 +1,9 @@
+from django.contrib import admin
+
+from app_media.models import ImageJob
+
+
+@admin.register(ImageJob)
+class ImageJobAdmin(admin.ModelAdmin):
+    list_display = 'id', 'action', 'model', 'object_id', 'status', 'attempts', 'updated_at',
+    list_filter = 'status', 'action',
@@ -0,0 +1,187 @@
+"""
+Database-backed queue of image work.
+
+Requests only store the uploaded file and add an ImageJob row in the same
+transaction; the process_image_jobs command picks the jobs up and does the
+slow part: checking the file with Pillow, re-encoding oversized or rotated
+photos, rendering the renditions and deleting replaced files. Rows whose
+file Pillow cannot read are deleted with it.
+
+Several workers may run at once, a job is taken by the one whose
+conditional UPDATE of its status succeeds.
+
+Files are deleted only once the rows are: the paths of all the rows deleted
+in a transaction go to a single job added when it commits, so deleting
+thousands of images costs one insert.
+"""
+import logging
+from datetime import timedelta
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import F
+from django.utils import timezone
+from PIL import Image as PillowImage, ImageOps, UnidentifiedImageError
+
+from store.conditional import mark_changed
+from store.transactions import OnCommitBatch
+
+from .models import ImageJob
+from .signals import image_stored
+from .variants import PILLOW_FORMATS, refresh_variants
+
+logger = logging.getLogger(__name__)
+
+EXIF_ORIENTATION = 0x0112
+
+
+class InvalidImage(Exception):
+    """The stored file is not an image Pillow can read, retrying will not help"""
+
+
+def enqueue_processing(instance, field='src'):
+    if getattr(instance, field).name:
+        ImageJob.objects.create(
+            action=ImageJob.PROCESS,
+            model=instance._meta.label,
+            object_id=instance.pk,
+        )
+
+
+def stored_paths(instance, field='src'):
+    """Names of the file of ``instance`` and of its renditions"""
+    paths = [getattr(instance, field).name] if getattr(instance, field).name else []
+    for extension in PILLOW_FORMATS:
+        paths.extend((instance.variants or {}).get(extension, {}).values())
+    return paths
+
+
+class FileDeletionBatch(OnCommitBatch):
+    """Files of the rows deleted in one transaction, removed by one job"""
+
+    def run(self, items):
+        ImageJob.objects.create(action=ImageJob.DELETE_FILES, paths=items)
+
+
+def enqueue_file_deletion(paths):
+    if paths:
+        FileDeletionBatch.add(paths)
+
+
+def normalize_image(name):
+    """
+    Re-encode the stored file when it is wider than IMAGE_JOBS['MAX_WIDTH']
+    or rotated by its EXIF orientation, which also drops the rest of EXIF.
+    Returns the name the file is stored under.
+    """
+    try:
+        with default_storage.open(name) as file:
+            image = PillowImage.open(file)
+            image.load()
+    except (UnidentifiedImageError, OSError) as error:
+        raise InvalidImage(f'{name}: {error}') from error
+
+    image_format = image.format
+    rotated = image.getexif().get(EXIF_ORIENTATION, 1) != 1
+    max_width = settings.IMAGE_JOBS['MAX_WIDTH']
+    if not rotated and image.width <= max_width:
+        return name
+
+    image = ImageOps.exif_transpose(image)
+    if image.width > max_width:
+        height = max(round(image.height * max_width / image.width), 1)
+        image = image.resize((max_width, height), PillowImage.LANCZOS)
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, image_format, quality=settings.IMAGE_VARIANTS['QUALITY'])
+    default_storage.delete(name)
+    return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def process_image(job, field='src'):
+    model = apps.get_model(job.model)
+    instance = model.objects.filter(pk=job.object_id).first()
+    if instance is None or not getattr(instance, field).name:
+        return
+
+    name = getattr(instance, field).name
+    try:
+        stored_name = normalize_image(name)
+    except InvalidImage:
+        # a broken image is dropped, its delete receivers remove the file
+        instance.delete()
+        raise
+    if stored_name != name:
+        model.objects.filter(pk=instance.pk).update(**{field: stored_name})
+        getattr(instance, field).name = stored_name
+        mark_changed(model)
+        image_stored.send(sender=model, instance=instance)
+    refresh_variants(instance, field, force=True)
+
+
+def delete_files(job):
+    for path in job.paths:
+        if default_storage.exists(path):
+            default_storage.delete(path)
+
+
+HANDLERS = {
+    ImageJob.PROCESS: process_image,
+    ImageJob.DELETE_FILES: delete_files,
+}
+
+
+def requeue_stale_jobs():
+    """Jobs of a worker which died while running them are pending again"""
+    stale_before = timezone.now() - timedelta(seconds=settings.IMAGE_JOBS['STALE_AFTER'])
+    return (
+        ImageJob.objects
+        .filter(status=ImageJob.RUNNING, updated_at__lt=stale_before)
+        .update(status=ImageJob.PENDING, updated_at=timezone.now())
+    )
+
+
+def claim(job_id):
+    return ImageJob.objects.filter(id=job_id, status=ImageJob.PENDING).update(
+        status=ImageJob.RUNNING, attempts=F('attempts') + 1, updated_at=timezone.now()
+    ) == 1
+
+
+def run_job(job):
+    try:
+        HANDLERS[job.action](job)
+    except InvalidImage as error:
+        status, message = ImageJob.FAILED, str(error)
+    except Exception as error:
+        logger.exception('Image job %s failed', job.id)
+        last_attempt = job.attempts >= settings.IMAGE_JOBS['MAX_ATTEMPTS']
+        status = ImageJob.FAILED if last_attempt else ImageJob.PENDING
+        message = f'{type(error).__name__}: {error}'
+    else:
+        status, message = ImageJob.DONE, ''
+    ImageJob.objects.filter(id=job.id).update(
+        status=status, error=message, updated_at=timezone.now()
+    )
+    return status
+
+
+def process_pending_jobs(limit=None):
+    """Run the pending jobs in the order they were added, return their number"""
+    limit = limit or settings.IMAGE_JOBS['BATCH']
+    job_ids = list(
+        ImageJob.objects
+        .filter(status=ImageJob.PENDING)
+        .order_by('id')
+        .values_list('id', flat=True)[:limit]
+    )
+    processed = 0
+    for job_id in job_ids:
+        if not claim(job_id):
+            continue  # taken by another worker
+        run_job(ImageJob.objects.get(id=job_id))
+        processed += 1
+    return processed
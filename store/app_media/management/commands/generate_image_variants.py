@@ -0,0 +1,51 @@
+import os
+from multiprocessing import Pool
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from app_media.variants import refresh_variants
+
+IMAGE_MODELS = ('app_products.Image', 'app_catalog.Image', 'app_auth.Avatar')
+
+
+def render(task):
+    """Runs in a worker process, which opens its own database connection"""
+    model_label, pk, force = task
+    instance = apps.get_model(model_label).objects.filter(pk=pk).first()
+    if instance is None:
+        return False
+    return refresh_variants(instance, force=force)
+
+
+class Command(BaseCommand):
+    help = 'Render the resized renditions of the stored images in worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Number of worker processes, 1 renders in this process'
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Render the images which already have their renditions'
+        )
+
+    def handle(self, *args, **options):
+        tasks = [
+            (model_label, pk, options['force'])
+            for model_label in IMAGE_MODELS
+            for pk in apps.get_model(model_label).objects.values_list('pk', flat=True)
+        ]
+        if options['workers'] <= 1:
+            rendered = sum(map(render, tasks))
+        else:
+            # forked workers must not share the connection of this process
+            connections.close_all()
+            with Pool(processes=options['workers']) as pool:
+                rendered = sum(pool.imap_unordered(render, tasks, chunksize=16))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {rendered} of {len(tasks)} images'
+        ))
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app_media.jobs import process_pending_jobs, requeue_stale_jobs
+
+
+class Command(BaseCommand):
+    help = 'Run the queued image jobs: checks, re-encoding, renditions and file removal'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Run the pending jobs and exit instead of waiting for new ones'
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=2,
+            help='Seconds to wait when the queue is empty'
+        )
+
+    def handle(self, *args, **options):
+        processed = 0
+        while True:
+            requeue_stale_jobs()
+            batch = process_pending_jobs()
+            processed += batch
+            if not batch:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} image jobs'))
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.6 on 2026-10-18 17:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('process', 'check, re-encode and render variants'), ('delete_files', 'delete files')], max_length=20, verbose_name='action')),
+                ('model', models.CharField(blank=True, max_length=50, verbose_name='image model')),
+                ('object_id', models.PositiveBigIntegerField(blank=True, null=True, verbose_name='image id')),
+                ('paths', models.JSONField(blank=True, default=list, verbose_name='files')),
+                ('status', models.CharField(choices=[('pending', 'pending'), ('running', 'running'), ('done', 'done'), ('failed', 'failed')], default='pending', max_length=10, verbose_name='status')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='attempts')),
+                ('error', models.TextField(blank=True, verbose_name='last error')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='updated')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'id'], name='image_job_queue')],
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+from django.db import models
+
+
+class ImageJob(models.Model):
+    """
+    Image work done out of the request by the process_image_jobs command:
+    checking and rendering an uploaded image, or removing old files.
+    """
+    PROCESS = 'process'
+    DELETE_FILES = 'delete_files'
+    ACTIONS = [
+        (PROCESS, 'check, re-encode and render variants'),
+        (DELETE_FILES, 'delete files'),
+    ]
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [
+        (PENDING, 'pending'),
+        (RUNNING, 'running'),
+        (DONE, 'done'),
+        (FAILED, 'failed'),
+    ]
+
+    action = models.CharField(verbose_name='action', max_length=20, choices=ACTIONS)
+    model = models.CharField(verbose_name='image model', max_length=50, blank=True)
+    object_id = models.PositiveBigIntegerField(verbose_name='image id', null=True, blank=True)
+    paths = models.JSONField(verbose_name='files', default=list, blank=True)
+    status = models.CharField(
+        verbose_name='status', max_length=10, choices=STATUSES, default=PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(verbose_name='attempts', default=0)
+    error = models.TextField(verbose_name='last error', blank=True)
+    created_at = models.DateTimeField(verbose_name='created', auto_now_add=True)
+    updated_at = models.DateTimeField(verbose_name='updated', auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='image_job_queue'),
+        ]
+
+    def __str__(self):
+        return f'{self.action} {self.model} {self.object_id or ""}: {self.status}'
@@ -0,0 +1,23 @@
+from rest_framework import serializers
+
+from .variants import PILLOW_FORMATS, build_srcset
+
+
+class SrcsetField(serializers.ReadOnlyField):
+    """
+    ``srcset`` values of the renditions of an image by format,
+    e.g. ``{'webp': '/media/.../a_160w.webp 160w, ...', 'jpeg': '...'}``.
+    Empty when the image has no renditions.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('source', 'variants')
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+        return {
+            extension: build_srcset(value, extension, request)
+            for extension in PILLOW_FORMATS
+            if (value or {}).get(extension)
+        }
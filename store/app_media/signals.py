@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# sent with ``sender`` (the model) and ``instance`` after the file or the
+# renditions of an image were stored with update(), which sends no post_save
+image_stored = Signal()
@@ -0,0 +1,198 @@
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, transaction
+from PIL import Image as PillowImage
+from rest_framework.test import APITestCase
+
+from app_catalog.cache import catalog_cache
+from app_catalog.models import CatalogItem, Image as CatalogImage
+from app_media.jobs import FileDeletionBatch, claim
+from app_media.models import ImageJob
+from app_products.models import Image, Product
+from app_products.serializers import ImageSerializer
+
+
+def make_png(width, height):
+    buffer = BytesIO()
+    PillowImage.new('RGBA', (width, height), (200, 30, 30, 255)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def make_rotated_jpeg(width, height):
+    """JPEG stored sideways, with the EXIF orientation of a rotated camera"""
+    exif = PillowImage.Exif()
+    exif[0x0112] = 6
+    buffer = BytesIO()
+    PillowImage.new('RGB', (width, height), (30, 200, 30)).save(buffer, 'JPEG', exif=exif)
+    return buffer.getvalue()
+
+
+def process_image_jobs():
+    call_command('process_image_jobs', once=True, stdout=StringIO())
+
+
+class ImageVariantsTest(APITestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        category = CatalogItem.objects.create(title='Variants category')
+        cls.product = Product.objects.create(
+            title='Variants product', description='Product with a photo',
+            price=1, count=1, rating=0, category=category
+        )
+
+    def test_variants_on_upload(self):
+        """Test that an upload gets resized renditions listed in srcset"""
+        image = Image.objects.create(
+            src=SimpleUploadedFile('variants.png', make_png(800, 400)),
+            product=self.product
+        )
+        image.refresh_from_db()
+        self.assertEqual(image.variants, {})
+
+        process_image_jobs()
+        image.refresh_from_db()
+        self.assertEqual(image.variants['source'], image.src.name)
+        self.assertEqual(set(image.variants['webp']), {'160', '320', '640', '800'})
+
+        path = image.variants['jpeg']['320']
+        with default_storage.open(path) as file:
+            self.assertEqual(PillowImage.open(file).size, (320, 160))
+
+        data = ImageSerializer(image).data
+        self.assertTrue(data['srcset']['webp'].startswith('/media/'))
+        self.assertTrue(data['srcset']['webp'].endswith('_800w.webp 800w'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            image.delete()
+        self.assertTrue(default_storage.exists(path))
+        process_image_jobs()
+        self.assertFalse(default_storage.exists(path))
+        self.assertFalse(default_storage.exists(image.src.name))
+
+    def test_variants_of_category_image(self):
+        """Test that the cached categories list the renditions once they are rendered"""
+        self.addCleanup(catalog_cache.bump)
+        category = CatalogItem.objects.create(title='Category with a photo')
+        image = CatalogImage.objects.create(
+            src=SimpleUploadedFile('category.png', make_png(200, 100)),
+            catalog_item=category
+        )
+        response = self.client.get('/api/categories/')
+        item = next(item for item in response.data if item['id'] == category.id)
+        self.assertEqual(item['image']['srcset'], {})
+
+        process_image_jobs()
+        response = self.client.get('/api/categories/')
+        item = next(item for item in response.data if item['id'] == category.id)
+        self.assertTrue(item['image']['srcset']['webp'].endswith('_200w.webp 200w'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            image.delete()
+        process_image_jobs()
+
+    def test_unreadable_upload(self):
+        """Test that images whose file Pillow cannot read are deleted with the file"""
+        image = Image.objects.create(
+            src=SimpleUploadedFile('broken.png', b'file data'),
+            product=self.product
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            process_image_jobs()
+        self.assertFalse(Image.objects.filter(pk=image.pk).exists())
+
+        job = ImageJob.objects.get(action=ImageJob.PROCESS, object_id=image.pk)
+        self.assertEqual((job.status, job.attempts), (ImageJob.FAILED, 1))
+        process_image_jobs()
+        self.assertFalse(default_storage.exists(image.src.name))
+
+    def test_normalize_upload(self):
+        """Test that rotated and oversized photos are re-encoded upright and narrower"""
+        image = Image.objects.create(
+            src=SimpleUploadedFile('rotated.jpg', make_rotated_jpeg(60, 40)),
+            product=self.product
+        )
+        with self.settings(IMAGE_JOBS={**settings.IMAGE_JOBS, 'MAX_WIDTH': 20}):
+            process_image_jobs()
+        image.refresh_from_db()
+        with default_storage.open(image.src.name) as file:
+            stored = PillowImage.open(file)
+            self.assertEqual(stored.size, (20, 30))
+            self.assertNotIn(0x0112, stored.getexif())
+        self.assertEqual(image.variants['source'], image.src.name)
+        self.assertEqual(set(image.variants['webp']), {'20'})
+        with self.captureOnCommitCallbacks(execute=True):
+            image.delete()
+        process_image_jobs()
+
+    def test_file_deletion_batched(self):
+        """Test that the files of the images deleted at once are removed by one job"""
+        images = Image.objects.bulk_create(
+            Image(src=f'images/products/batch_{number}.png', product=self.product)
+            for number in range(3)
+        )
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Image.objects.filter(product=self.product).delete()
+        # one deletion callback, next to the change markers of store.conditional
+        deletions = [
+            callback for callback in callbacks if isinstance(callback, FileDeletionBatch)
+        ]
+        self.assertEqual(len(deletions), 1)
+
+        job = ImageJob.objects.get(action=ImageJob.DELETE_FILES)
+        self.assertEqual(set(job.paths), {image.src.name for image in images})
+
+    def test_file_deletion_rolled_back(self):
+        """Test that the files of a rolled back savepoint are not deleted"""
+        kept = Image.objects.create(src='images/products/kept.png', product=self.product)
+        deleted = Image.objects.create(src='images/products/deleted.png', product=self.product)
+        with self.captureOnCommitCallbacks(execute=True):
+            deleted.delete()
+            try:
+                with transaction.atomic():
+                    kept.delete()
+                    raise DatabaseError
+            except DatabaseError:
+                pass
+
+        self.assertTrue(Image.objects.filter(src='images/products/kept.png').exists())
+        job = ImageJob.objects.get(action=ImageJob.DELETE_FILES)
+        self.assertEqual(job.paths, ['images/products/deleted.png'])
+
+    def test_job_claimed_once(self):
+        """Test that a job is taken by one worker and retried after an error"""
+        job = ImageJob.objects.create(
+            action=ImageJob.PROCESS, model='app_products.Missing', object_id=1
+        )
+        self.assertTrue(claim(job.id))
+        self.assertFalse(claim(job.id))
+
+        ImageJob.objects.filter(id=job.id).update(status=ImageJob.PENDING)
+        with self.settings(IMAGE_JOBS={**settings.IMAGE_JOBS, 'MAX_ATTEMPTS': 3}), \
+                self.assertLogs('app_media.jobs', 'ERROR'):
+            process_image_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (ImageJob.FAILED, 3))
+        self.assertIn('LookupError', job.error)
+
+    def test_backfill_command(self):
+        """Test rendering the renditions of images stored before"""
+        image = Image.objects.create(
+            src=SimpleUploadedFile('backfill.png', make_png(100, 100)),
+            product=self.product
+        )
+        Image.objects.filter(pk=image.pk).update(variants={})
+
+        call_command('generate_image_variants', workers=1, stdout=StringIO())
+        image.refresh_from_db()
+        self.assertEqual(image.variants['webp'], {
+            '100': 'images/products/%s/variants/backfill_100w.webp' % self.product.id
+        })
+        with self.captureOnCommitCallbacks(execute=True):
+            image.delete()
+        process_image_jobs()
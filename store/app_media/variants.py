@@ -0,0 +1,128 @@
+"""
+Resized renditions of uploaded images.
+
+Every image model of the shop (product images, category images, avatars)
+keeps the names of its renditions in a ``variants`` JSON field::
+
+    {
+        'source': 'images/products/1/photo.png',
+        'webp': {'160': 'images/products/1/variants/photo_160w.webp', ...},
+        'jpeg': {'160': 'images/products/1/variants/photo_160w.jpeg', ...},
+    }
+
+``source`` is the file the renditions were made from, so a new upload is
+noticed on save. Widths and formats come from settings.IMAGE_VARIANTS.
+Files that Pillow cannot read get no renditions, the image jobs
+(app_media.jobs) delete their rows.
+"""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image as PillowImage, ImageOps, UnidentifiedImageError
+
+from store.conditional import mark_changed
+
+from .signals import image_stored
+
+PILLOW_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+
+
+def variant_name(name, width, extension):
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(directory, 'variants', f'{stem}_{width}w.{extension}')
+
+
+def encode(image, extension):
+    if extension == 'jpeg' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(
+        buffer, PILLOW_FORMATS[extension], quality=settings.IMAGE_VARIANTS['QUALITY']
+    )
+    return buffer.getvalue()
+
+
+def render_variants(name):
+    """Write the renditions of the stored file ``name``, return their names"""
+    config = settings.IMAGE_VARIANTS
+    try:
+        with default_storage.open(name) as file:
+            original = PillowImage.open(file)
+            original.load()
+    except (FileNotFoundError, UnidentifiedImageError, OSError):
+        return {'source': name}
+
+    original = ImageOps.exif_transpose(original)
+    if original.mode == 'P':
+        original = original.convert('RGBA')
+
+    # no upscaling: widths over the original one are replaced by it
+    widths = sorted({min(width, original.width) for width in config['WIDTHS']})
+    variants = {'source': name}
+    for extension in config['FORMATS']:
+        variants[extension] = {}
+        for width in widths:
+            height = max(round(original.height * width / original.width), 1)
+            resized = original.resize((width, height), PillowImage.LANCZOS)
+            path = variant_name(name, width, extension)
+            if default_storage.exists(path):
+                default_storage.delete(path)
+            variants[extension][str(width)] = default_storage.save(
+                path, ContentFile(encode(resized, extension))
+            )
+    return variants
+
+
+def delete_variants(variants):
+    for extension in PILLOW_FORMATS:
+        for path in (variants or {}).get(extension, {}).values():
+            if default_storage.exists(path):
+                default_storage.delete(path)
+
+
+def needs_variants(instance, field='src'):
+    name = getattr(instance, field).name
+    return bool(name) and (instance.variants or {}).get('source') != name
+
+
+def refresh_variants(instance, field='src', force=False):
+    """
+    Render the variants of the image of ``instance`` when its file changed
+    and store them without calling save(): only image_stored is sent.
+    """
+    if not force and not needs_variants(instance, field):
+        return False
+
+    old_variants = instance.variants
+    instance.variants = render_variants(getattr(instance, field).name)
+    if old_variants:
+        # renditions of the same width and format were overwritten in place
+        stale = {
+            extension: {
+                width: path for width, path in old_variants.get(extension, {}).items()
+                if path != instance.variants.get(extension, {}).get(width)
+            }
+            for extension in PILLOW_FORMATS
+        }
+        delete_variants(stale)
+    type(instance).objects.filter(pk=instance.pk).update(variants=instance.variants)
+    mark_changed(type(instance))
+    image_stored.send(sender=type(instance), instance=instance)
+    return True
+
+
+def build_srcset(variants, extension, request=None):
+    """'url 160w, url 320w' of the renditions in one format"""
+    urls = []
+    for width, path in sorted(
+        (variants or {}).get(extension, {}).items(), key=lambda item: int(item[0])
+    ):
+        url = default_storage.url(path)
+        if request is not None:
+            url = request.build_absolute_uri(url)
+        urls.append(f'{url} {width}w')
+    return ', '.join(urls)
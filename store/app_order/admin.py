@@ -8,7 +8,7 @@ class OrderAdmin(admin.ModelAdmin):
     list_display = (
         'id', 'date_created', 'delivery_type', 'payment_type', 'total_cost',
         'status', 'city', 'address', 'user', 'delivery_name', 'delivery_email',
-        'delivery_phone'
+        'delivery_phone', 'stock_reserved'
     )
 
 
@@ -0,0 +1,170 @@
+"""
+Stock reservation of orders.
+
+Stock is taken with one conditional UPDATE for all lines of an order:
+``count = count - n, sold = sold + n WHERE count >= n``. The database checks
+and changes every row atomically, so parallel checkouts cannot oversell and
+no table lock is needed. Orders left in 'Products selected' longer than
+ORDER_RESERVATION_TIMEOUT give their products back (release_abandoned_orders).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Sum, Value, When
+from django.utils import timezone
+
+from app_catalog.models import mark_rankings_stale, refresh_category_stats
+from app_catalog.rankings import LIMITED_COUNTS
+from app_order.models import Order, OrderProduct
+from app_products.models import Product
+from store.conditional import mark_changed
+from store.proxy_cache import purge_products
+from store.transactions import OnCommitBatch
+
+ORDER_SELECTED = 'Products selected'
+ORDER_ABANDONED = 'Cancelled: not paid in time'
+
+
+class OutOfStock(Exception):
+    """Some lines of an order cannot be served from the stock"""
+
+    def __init__(self, conflicts):
+        super().__init__(f'Not enough products in stock: {conflicts}')
+        self.conflicts = conflicts
+
+
+def _counts_by_product(lines):
+    return Case(
+        *[When(pk=product_id, then=Value(count)) for product_id, count in lines.items()],
+        output_field=PositiveIntegerField()
+    )
+
+
+class StockChanges(OnCommitBatch):
+    """
+    ``(category_id, count before, count after)`` of the products whose stock
+    changed in one transaction. Once it commits, the in-stock stats are
+    recomputed for counts crossing 0 and the "limited" lists are marked stale
+    for counts entering or leaving LIMITED_COUNTS. "popular" follows the
+    sales with its TTL and the refresh_rankings command.
+    """
+
+    def run(self, items):
+        stats_ids = {
+            category_id for category_id, before, after in items
+            if (before > 0) != (after > 0)
+        }
+        limited_ids = {
+            category_id for category_id, before, after in items
+            if (before in LIMITED_COUNTS) != (after in LIMITED_COUNTS)
+        }
+        if stats_ids:
+            refresh_category_stats(stats_ids)
+        if limited_ids:
+            mark_rankings_stale(limited_ids, names=['limited'])
+
+
+def refresh_stock_data(changes):
+    """Precomputed data that depends on the ``{product_id: change}`` of the stock"""
+    StockChanges.add(
+        (category_id, count - changes[product_id], count)
+        for product_id, category_id, count in
+        Product.objects
+        .filter(pk__in=changes)
+        .values_list('id', 'category_id', 'count')
+    )
+    # counts are updated in bulk, without signals
+    mark_changed(Product)
+    purge_products(changes)
+
+
+class _PartialReservation(Exception):
+    pass
+
+
+def reserve_stock(lines):
+    """
+    Take ``{product_id: count}`` from the stock, all lines or none.
+    OutOfStock lists the lines that cannot be served, with the available count.
+    """
+    lines = {product_id: count for product_id, count in lines.items() if count > 0}
+    if not lines:
+        return
+
+    counts = _counts_by_product(lines)
+    try:
+        with transaction.atomic():
+            reserved = (
+                Product.objects
+                .filter(pk__in=lines, count__gte=counts)
+                .update(count=F('count') - counts, sold=F('sold') + counts)
+            )
+            if reserved != len(lines):
+                raise _PartialReservation
+    except _PartialReservation:
+        available = dict(
+            Product.objects
+            .filter(pk__in=lines)
+            .values_list('id', 'count')
+        )
+        raise OutOfStock([
+            {
+                'id': product_id,
+                'requested': count,
+                'available': available.get(product_id, 0),
+            }
+            for product_id, count in lines.items()
+            if available.get(product_id, 0) < count
+        ])
+
+    refresh_stock_data({product_id: -count for product_id, count in lines.items()})
+
+
+def release_stock(order_id):
+    """Give the products of the order back to the stock"""
+    lines = dict(
+        OrderProduct.objects
+        .filter(order_id=order_id)
+        .values('product_id')
+        .annotate(total=Sum('count'))
+        .values_list('product_id', 'total')
+    )
+    if not lines:
+        return
+
+    counts = _counts_by_product(lines)
+    (
+        Product.objects
+        .filter(pk__in=lines, sold__gte=counts)
+        .update(count=F('count') + counts, sold=F('sold') - counts)
+    )
+    refresh_stock_data(lines)
+
+
+def release_abandoned_orders(timeout=None):
+    """
+    Cancel the orders that kept their products reserved
+    in 'Products selected' for longer than the timeout (seconds).
+    """
+    if timeout is None:
+        timeout = settings.ORDER_RESERVATION_TIMEOUT
+    deadline = timezone.now() - timedelta(seconds=timeout)
+    order_ids = (
+        Order.objects
+        .filter(status=ORDER_SELECTED, stock_reserved=True, date_created__lt=deadline)
+        .values_list('id', flat=True)
+    )
+
+    released = 0
+    for order_id in order_ids:
+        with transaction.atomic():
+            # the order may have been paid or released by another worker meanwhile
+            if (
+                Order.objects
+                .filter(pk=order_id, status=ORDER_SELECTED, stock_reserved=True)
+                .update(status=ORDER_ABANDONED, stock_reserved=False)
+            ):
+                release_stock(order_id)
+                released += 1
+    return released
@@ -0,0 +1,150 @@
+import os
+import statistics
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+from django.db.utils import load_backend
+
+from app_auth.models import Profile
+from app_basket.models import BasketItem, add_to_basket
+from app_catalog.models import CatalogItem
+from app_order.views import SetOrdersView
+from app_products.models import Product
+
+
+def use_database(settings_dict):
+    """Point the default database of the current thread at ``settings_dict``"""
+    settings_dict = connections.configure_settings({DEFAULT_DB_ALIAS: settings_dict})
+    backend = load_backend(settings_dict[DEFAULT_DB_ALIAS]['ENGINE'])
+    connections[DEFAULT_DB_ALIAS] = backend.DatabaseWrapper(
+        settings_dict[DEFAULT_DB_ALIAS], DEFAULT_DB_ALIAS
+    )
+
+
+def in_thread(settings_dict, function, *args):
+    """Run ``function`` in a thread of its own connection to the database"""
+    def target():
+        use_database(settings_dict)
+        try:
+            function(*args)
+        finally:
+            connections[DEFAULT_DB_ALIAS].close()
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    return thread
+
+
+class Command(BaseCommand):
+    help = (
+        'Run concurrent basket and order writers on a scratch SQLite file '
+        'with each database profile and compare their throughput and errors'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=8,
+            help='Writer threads, half add to baskets and half place orders'
+        )
+        parser.add_argument(
+            '--operations', type=int, default=50, help='Operations of each writer'
+        )
+        parser.add_argument(
+            '--profile', action='append', choices=sorted(settings.DATABASE_PROFILES),
+            help='Profile to run, may be repeated (all of them by default)'
+        )
+
+    def handle(self, *args, **options):
+        for profile in options['profile'] or sorted(settings.DATABASE_PROFILES):
+            with tempfile.TemporaryDirectory() as directory:
+                settings_dict = {
+                    **settings.DATABASE_PROFILES[profile],
+                    'NAME': os.path.join(directory, 'contention.sqlite3'),
+                }
+                self.run_profile(profile, settings_dict, options)
+
+    def run_profile(self, profile, settings_dict, options):
+        workers = max(options['workers'], 2)
+        prepared = {}
+        in_thread(settings_dict, self.prepare, workers, prepared).join()
+
+        results = []
+        barrier = threading.Barrier(workers)
+        started = time.perf_counter()
+        threads = [
+            in_thread(
+                settings_dict, self.write,
+                self.add_to_basket if number % 2 else self.place_order,
+                prepared['users'][number], prepared['products'],
+                options['operations'], barrier, results,
+            )
+            for number in range(workers)
+        ]
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        timings = sorted(timing for outcome, timing in results if outcome == 'ok')
+        outcomes = Counter(outcome for outcome, _ in results)
+        errors = ', '.join(
+            f'{count} {outcome}' for outcome, count in outcomes.items() if outcome != 'ok'
+        )
+        line = (
+            f'{profile}: {len(timings)}/{len(results)} operations, '
+            f'{len(timings) / elapsed:.0f}/s'
+        )
+        if timings:
+            p95 = timings[max(int(len(timings) * 0.95) - 1, 0)]
+            line += (
+                f', median {statistics.median(timings) * 1e3:.1f} ms'
+                f', p95 {p95 * 1e3:.1f} ms'
+            )
+        self.stdout.write(line + (f', errors: {errors}' if errors else ''))
+
+    @staticmethod
+    def prepare(workers, prepared):
+        call_command('migrate', verbosity=0, interactive=False)
+        category = CatalogItem.objects.create(title='Contention category')
+        prepared['products'] = [
+            Product.objects.create(
+                title=f'Contention product {number}', description='Benchmark product',
+                price=10, count=10 ** 6, rating=0, category=category,
+            ).pk
+            for number in range(4)
+        ]
+        prepared['users'] = []
+        for number in range(workers):
+            user = User.objects.create_user(username=f'contention_{number}')
+            Profile.objects.create(user=user)
+            prepared['users'].append(user.pk)
+
+    @staticmethod
+    def write(operation, user_id, products, operations, barrier, results):
+        user = User.objects.select_related('profile').get(pk=user_id)
+        barrier.wait()
+        for number in range(operations):
+            started = time.perf_counter()
+            try:
+                operation(user, products[number % len(products)])
+            except OperationalError as error:
+                results.append((str(error), time.perf_counter() - started))
+            else:
+                results.append(('ok', time.perf_counter() - started))
+
+    @staticmethod
+    def add_to_basket(user, product_id):
+        # the basket view answers with the basket it added to
+        add_to_basket(user.pk, product_id, 1)
+        list(BasketItem.objects.filter(user=user).values('product_id', 'count'))
+
+    @staticmethod
+    def place_order(user, product_id):
+        with transaction.atomic():
+            SetOrdersView.create_order(user, {product_id: 1})
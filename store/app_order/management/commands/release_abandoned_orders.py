@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app_order.inventory import release_abandoned_orders
+
+
+class Command(BaseCommand):
+    help = 'Give back the stock of orders not checked out in time'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--timeout', type=int, default=settings.ORDER_RESERVATION_TIMEOUT,
+            help='Age in seconds of the orders to release'
+        )
+
+    def handle(self, *args, **options):
+        released = release_abandoned_orders(options['timeout'])
+        self.stdout.write(self.style.SUCCESS(f'Released {released} orders'))
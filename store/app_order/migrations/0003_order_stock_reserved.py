@@ -0,0 +1,18 @@
+# Generated by Django 4.2.6 on 2026-10-18 17:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_order', '0002_order_delivery_email_order_delivery_name_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='stock_reserved',
+            field=models.BooleanField(default=False, verbose_name='Products reserved in stock'),
+        ),
+    ]
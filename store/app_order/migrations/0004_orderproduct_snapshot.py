@@ -0,0 +1,49 @@
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_snapshots(apps, schema_editor):
+    # the prices of past checkouts are unknown, the current price is the best guess
+    OrderProduct = apps.get_model('app_order', 'OrderProduct')
+    Product = apps.get_model('app_products', 'Product')
+    Image = apps.get_model('app_products', 'Image')
+    product = Product.objects.filter(pk=OuterRef('product_id'))
+    image = (
+        Image.objects
+        .filter(product=OuterRef('product_id'))
+        .order_by('id')
+        .values('src')[:1]
+    )
+    OrderProduct.objects.update(
+        title=Subquery(product.values('title')),
+        price=Subquery(product.values('price')),
+        image=Coalesce(Subquery(image), Value('')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_order', '0003_order_stock_reserved'),
+        ('app_products', '0012_product_rating_sum'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderproduct',
+            name='image',
+            field=models.CharField(blank=True, max_length=100, verbose_name='Product image'),
+        ),
+        migrations.AddField(
+            model_name='orderproduct',
+            name='price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Unit price'),
+        ),
+        migrations.AddField(
+            model_name='orderproduct',
+            name='title',
+            field=models.CharField(blank=True, max_length=70, verbose_name='Product title'),
+        ),
+        migrations.RunPython(fill_snapshots, migrations.RunPython.noop),
+    ]
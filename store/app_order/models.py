@@ -18,10 +18,19 @@ class Order(models.Model):
     delivery_phone = models.PositiveBigIntegerField(
         verbose_name='Phone number for delivery', null=True, blank=True, default=0
     )
+    stock_reserved = models.BooleanField(
+        verbose_name='Products reserved in stock', default=False
+    )
 
 
 class OrderProduct(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='order_product')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     count = models.PositiveIntegerField(verbose_name='Count')
+    # snapshot of the product at checkout, for the order history
+    title = models.CharField(verbose_name='Product title', max_length=70, blank=True)
+    price = models.DecimalField(
+        verbose_name='Unit price', max_digits=10, decimal_places=2, null=True, blank=True
+    )
+    image = models.CharField(verbose_name='Product image', max_length=100, blank=True)
 
@@ -1,7 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
 
-from app_order.models import Order
+from app_order.models import Order, OrderProduct
 from app_catalog.serializers import ProductSerializerForCatalog
 
 
@@ -14,8 +15,7 @@ class ProfileForOrderSerializer(serializers.ModelSerializer):
 
 
 class ProductSerializerForOrders(ProductSerializerForCatalog):
-    def get_reviews(self, instance):
-        return len(instance.review_set.all())
+    pass
 
 
 class OrderSerializer(serializers.ModelSerializer):
@@ -47,3 +47,31 @@ class OrderSerializer(serializers.ModelSerializer):
             'total_cost', 'status', 'city', 'address', 'delivery_name',
             'email', 'phone', 'products',
         ]
+
+
+class OrderLineSerializer(serializers.ModelSerializer):
+    """Product of an order as it was at checkout"""
+    id = serializers.IntegerField(source='product_id')
+    images = serializers.SerializerMethodField()
+
+    class Meta:
+        model = OrderProduct
+        fields = ['id', 'title', 'price', 'count', 'images']
+
+    def get_images(self, instance):
+        if not instance.image:
+            return []
+        return [{'src': default_storage.url(instance.image), 'alt': instance.title}]
+
+    def to_representation(self, instance):
+        representation = super().to_representation(instance)
+        if representation['price'] is not None:
+            representation['price'] = float(representation['price'])
+        return representation
+
+
+class OrderHistorySerializer(OrderSerializer):
+    """Order rendered from the order tables only"""
+
+    def get_products(self, obj):
+        return OrderLineSerializer(obj.order_product.all(), many=True).data
@@ -0,0 +1,51 @@
+import os
+import sqlite3
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connections
+from rest_framework.test import APITestCase
+
+from store.sqlite_backend.base import DatabaseWrapper
+
+
+class ProductionDatabaseTest(APITestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.name = os.path.join(directory.name, 'db.sqlite3')
+        settings_dict = {**settings.DATABASE_PROFILES['production'], 'NAME': self.name}
+        self.wrapper = DatabaseWrapper(
+            connections.configure_settings({'default': settings_dict})['default'], 'production'
+        )
+        self.addCleanup(self.wrapper.close)
+
+    def test_pragmas(self):
+        """Test that the production profile sets its PRAGMAs on new connections"""
+        with self.wrapper.cursor() as cursor:
+            expected_values = (('journal_mode', 'wal'), ('synchronous', 1), ('busy_timeout', 5000))
+            for name, expected in expected_values:
+                cursor.execute(f'PRAGMA {name}')
+                self.assertEqual(cursor.fetchone()[0], expected)
+
+    def test_write_lock_taken_at_begin(self):
+        """Test that transactions of the production profile begin IMMEDIATE"""
+        self.wrapper.ensure_connection()
+        self.wrapper._start_transaction_under_autocommit()
+        other = sqlite3.connect(self.name, timeout=0, isolation_level=None)
+        self.addCleanup(other.close)
+        with self.assertRaisesMessage(sqlite3.OperationalError, 'database is locked'):
+            other.execute('BEGIN IMMEDIATE')
+        self.wrapper.connection.rollback()
+
+    def test_contention_benchmark(self):
+        """Test the concurrent basket and order writers of the benchmark command"""
+        out = StringIO()
+        call_command(
+            'benchmark_sqlite_contention', workers=2, operations=3,
+            profile=['production'], stdout=out
+        )
+        self.assertTrue(out.getvalue().startswith('production: 6/6 operations'))
@@ -1,15 +1,24 @@
 import json
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
 
 from django.contrib.auth.models import User
+from django.core.management import call_command
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 
-from app_products.models import Product
-from app_catalog.models import CatalogItem
+from app_products.models import Product, SaleItem
+from app_catalog.models import (
+    CatalogItem, CategoryStats, RankedList, refresh_category_stats
+)
+from app_catalog.rankings import RANKINGS, refresh_ranking
+from app_order.inventory import reserve_stock
 from app_order.models import Order, OrderProduct
 from app_auth.models import Profile
+from store.testing import QueryBudgetMixin
 
-class OrderViewsTestCase(APITestCase):
+class OrderViewsTestCase(QueryBudgetMixin, APITestCase):
 
     @classmethod
     def setUpClass(cls):
@@ -180,6 +189,141 @@ class OrderViewsTestCase(APITestCase):
         self.assertEqual(len(data['products']), 2)
         self.client.logout()
 
+    def test_order_prices_from_database(self):
+        """Test that order totals use database prices and running sales"""
+        today = date.today()
+        SaleItem.objects.create(
+            product=self.product_2, sale_price=10,
+            date_from=today - timedelta(days=1), date_to=today + timedelta(days=1)
+        )
+        SaleItem.objects.create(
+            product=self.product_2, sale_price=1,
+            date_from=today - timedelta(days=10), date_to=today - timedelta(days=5)
+        )
+        products = [
+            Product.objects.create(
+                title=f'Bulk product # {number}', description='Bulk product',
+                price=1, count=10, rating=5, category=self.category
+            )
+            for number in range(50)
+        ]
+        lines = [
+            {'id': self.product_1.id, 'price': 0.01, 'count': 2},
+            {'id': self.product_2.id, 'price': 0.01, 'count': 1},
+        ] + [
+            {'id': product.id, 'price': 0.01, 'count': 1} for product in products
+        ]
+
+        self.client.login(username=self.user_1.username, password='12345')
+        response = self.client.post(
+            '/api/orders', data=json.dumps(lines), content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        order = Order.objects.get(pk=response.data['orderId'])
+        self.assertEqual(order.total_cost, Decimal('1.99') * 2 + 10 + 50)
+        self.assertEqual(order.order_product.count(), 52)
+
+    def test_order_stock_reservation(self):
+        """Test that checkout takes the stock, refuses oversells and releases abandoned orders"""
+        self.client.login(username=self.user_1.username, password='12345')
+        lines = [
+            {'id': self.product_1.id, 'price': 1.99, 'count': 3},
+            {'id': self.product_2.id, 'price': 15.99, 'count': 1},
+        ]
+        response = self.client.post(
+            '/api/orders', data=json.dumps(lines), content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(
+            response.data['conflicts'],
+            [{'id': self.product_1.id, 'requested': 3, 'available': 2}]
+        )
+        self.product_2.refresh_from_db()
+        self.assertEqual((self.product_2.count, self.product_2.sold), (3, 0))
+
+        response = self.client.post(
+            '/api/orders', data=self.test_data, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.product_1.refresh_from_db()
+        self.assertEqual((self.product_1.count, self.product_1.sold), (0, 2))
+
+        order = Order.objects.get(pk=response.data['orderId'])
+        self.assertTrue(order.stock_reserved)
+        call_command('release_abandoned_orders', timeout=60, stdout=StringIO())
+        self.product_1.refresh_from_db()
+        self.assertEqual(self.product_1.count, 0)
+
+        Order.objects.filter(pk=order.pk).update(
+            date_created=order.date_created - timedelta(minutes=5)
+        )
+        call_command('release_abandoned_orders', timeout=60, stdout=StringIO())
+        self.product_1.refresh_from_db()
+        self.product_2.refresh_from_db()
+        self.assertEqual((self.product_1.count, self.product_1.sold), (2, 0))
+        self.assertEqual((self.product_2.count, self.product_2.sold), (3, 0))
+        order.refresh_from_db()
+        self.assertFalse(order.stock_reserved)
+
+    def test_stock_data_refreshed_on_commit(self):
+        """Test that stats and the limited lists are refreshed for the counts that need it"""
+        category = CatalogItem.objects.create(title='Stock data category')
+        plenty, few, last = (
+            Product.objects.create(
+                title=f'Stock data product # {count}', description='Stock data product',
+                price=1, count=count, rating=5, category=category
+            )
+            for count in (5, 4, 1)
+        )
+        refresh_category_stats([category.id])
+        for name in RANKINGS:
+            refresh_ranking(name)
+            refresh_ranking(name, category.id)
+
+        def stale_lists():
+            return set(RankedList.objects.filter(stale=True).values_list('name', 'category_id'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_stock({plenty.id: 1})
+        self.assertEqual(stale_lists(), set())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_stock({few.id: 2})
+        self.assertEqual(stale_lists(), {('limited', None), ('limited', category.id)})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_stock({last.id: 1})
+        self.assertEqual(CategoryStats.objects.get(category=category).in_stock_count, 2)
+
+    def test_order_history_pages(self):
+        """Test the paginated order history rendered from line snapshots"""
+        self.client.login(username=self.user_1.username, password='12345')
+        response = self.client.post(
+            '/api/orders', data=self.test_data, content_type='application/json'
+        )
+        order_id = response.data['orderId']
+        Product.objects.filter(pk=self.product_1.pk).update(title='Renamed', price=100)
+
+        response = self.client.get('/api/orders/history', data={'limit': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['items']), 2)
+        order = response.data['items'][0]
+        self.assertEqual(order['id'], order_id)
+        line = next(
+            line for line in order['products'] if line['id'] == self.product_1.id
+        )
+        self.assertEqual(line['title'], 'Product for tests # 1')
+        self.assertEqual(line['price'], 1.99)
+        self.assertEqual(line['count'], 2)
+        self.assertEqual(len(line['images']), 1)
+
+        response = self.client.get(
+            '/api/orders/history',
+            data={'limit': 2, 'cursor': response.data['nextCursor']}
+        )
+        self.assertEqual(len(response.data['items']), 1)
+        self.assertIsNone(response.data['nextCursor'])
+
     def test_post_order_for_unauthenticated(self):
         """Test posting orders for unauthenticated"""
 
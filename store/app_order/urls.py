@@ -1,10 +1,13 @@
 from django.urls import path
 
-from app_order.views import SetOrdersView, OrderView, PaymentAPIView
+from app_order.views import (
+    SetOrdersView, OrderView, PaymentAPIView, OrderHistoryView
+)
 
 
 urlpatterns = [
     path('orders', SetOrdersView.as_view(), name='history'),
+    path('orders/history', OrderHistoryView.as_view(), name='orders-history'),
     path('order/<int:pk>', OrderView.as_view(), name='order'),
 
     path('payment/<int:pk>', PaymentAPIView.as_view(), name='payment'),
@@ -1,15 +1,19 @@
-from rest_framework.generics import RetrieveAPIView
+from django.db import transaction
+from rest_framework.generics import ListAPIView, RetrieveAPIView
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 
+from app_order.inventory import ORDER_SELECTED, OutOfStock, reserve_stock
 from app_order.models import Order, OrderProduct
-from app_products.models import Product
+from app_products.models import DEFAULT_IMAGE_FOR_PRODUCTS, Product, with_current_price
 from app_basket.models import BasketItem
-from app_order.serializers import OrderSerializer
+from app_order.serializers import OrderHistorySerializer, OrderSerializer
+from app_catalog.views import SeekPagination
 
 
 class OrderView(RetrieveAPIView):
+    query_budget = {'get': 7, 'post': 6}
     permission_classes = [IsAuthenticated]
     serializer_class = OrderSerializer
 
@@ -19,7 +23,6 @@ class OrderView(RetrieveAPIView):
             Order.objects.all()
             .prefetch_related('order_product__product__tags')
             .prefetch_related('order_product__product__product_image')
-            .prefetch_related('order_product__product__review_set')
         )
         return queryset
 
@@ -45,6 +48,7 @@ class OrderView(RetrieveAPIView):
 
 
 class SetOrdersView(APIView):
+    query_budget = {'get': 7, 'post': 14}
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
@@ -54,7 +58,6 @@ class SetOrdersView(APIView):
             .prefetch_related('order_product__product')
             .prefetch_related('order_product__product__tags')
             .prefetch_related('order_product__product__product_image')
-            .prefetch_related('order_product__product__review_set')
         )
         serializer = OrderSerializer(queryset, many=True)
         return Response(data=serializer.data)
@@ -62,18 +65,40 @@ class SetOrdersView(APIView):
     def post(self, request):
         data = request.data
         products_dict = {}
-        total_price = 0
         for product in data:
-            total_price += product['price'] * product['count']
             products_dict[product['id']] = product['count']
-        total_price = round(total_price, 2)
 
-        products = list(products_dict.keys())
-
-        products = Product.objects.filter(id__in=products)
         user = request.user
+        try:
+            with transaction.atomic():
+                order_for_current_user = self.create_order(user, products_dict)
+        except OutOfStock as error:
+            return Response(
+                {
+                    'message': 'not enough products in stock',
+                    'conflicts': error.conflicts
+                },
+                status=409
+            )
+        return Response(
+            {"orderId": order_for_current_user.id},
+            status=200
+        )
 
-        order_for_current_user = Order.objects.create(
+    @staticmethod
+    def create_order(user, products_dict):
+        # prices come from the database, not from the client
+        products = list(
+            with_current_price(Product.objects.filter(id__in=products_dict))
+            .prefetch_related('product_image')
+        )
+        reserve_stock({product.id: products_dict[product.id] for product in products})
+        total_price = sum(
+            product.current_price * products_dict[product.id]
+            for product in products
+        )
+
+        order = Order.objects.create(
             user=user,
             total_cost=total_price,
             delivery_name=user.first_name,
@@ -83,25 +108,56 @@ class SetOrdersView(APIView):
             address=user.profile.default_address,
             delivery_type=user.profile.default_delivery_type,
             payment_type=user.profile.default_payment_type,
-            status='Products selected'
+            status=ORDER_SELECTED,
+            stock_reserved=True
         )
 
-        for product in products:
-            count = products_dict[product.id]
-            OrderProduct.objects.create(
-                order=order_for_current_user,
+        OrderProduct.objects.bulk_create([
+            OrderProduct(
+                order=order,
                 product=product,
-                count=count
+                count=products_dict[product.id],
+                title=product.title,
+                price=product.current_price,
+                image=get_first_image(product),
             )
+            for product in products
+        ])
 
         BasketItem.objects.filter(user=user).delete()
-        return Response(
-            {"orderId": order_for_current_user.id},
-            status=200
+        return order
+
+
+class OrderHistoryPagination(SeekPagination):
+    page_size = 10
+
+
+class OrderHistoryView(ListAPIView):
+    """
+    Orders of the user, newest first, page by page with the cursor.
+    Products come from the snapshots stored at checkout.
+    """
+    query_budget = 4
+    permission_classes = [IsAuthenticated]
+    serializer_class = OrderHistorySerializer
+    pagination_class = OrderHistoryPagination
+
+    def get_queryset(self):
+        return (
+            Order.objects
+            .filter(user=self.request.user)
+            .prefetch_related('order_product')
+            .order_by('-date_created', '-id')
         )
 
 
+def get_first_image(product):
+    images = product.product_image.all()
+    return images[0].src.name if images else DEFAULT_IMAGE_FOR_PRODUCTS
+
+
 class PaymentAPIView(APIView):
+    query_budget = 4
     permission_classes = [IsAuthenticated]
 
     def post(self, request, pk):
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from app_products.models import recount_reviews
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the stored number of reviews, the sum of their rates '
+        'and the rating of every product'
+    )
+
+    def handle(self, *args, **options):
+        updated = recount_reviews()
+        self.stdout.write(self.style.SUCCESS(f'Recounted reviews of {updated} products'))
@@ -0,0 +1,58 @@
+from django.db import migrations
+
+# the SQL of app_products.search as of this migration, which must not change with it
+CREATE_TABLE_SQL = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS app_products_productsearch USING fts5(
+        title, description, tags, specifications,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+'''
+
+INDEX_SELECT_SQL = '''
+    INSERT INTO app_products_productsearch (rowid, title, description, tags, specifications)
+    SELECT
+        product.id,
+        product.title,
+        product.description,
+        COALESCE((
+            SELECT group_concat(tag.name, ' ')
+            FROM app_products_product_tags AS product_tag
+            JOIN app_products_tag AS tag ON tag.id = product_tag.tag_id
+            WHERE product_tag.product_id = product.id
+        ), ''),
+        COALESCE((
+            SELECT group_concat(spec.name || ' ' || spec.value, ' ')
+            FROM app_products_product_specifications AS product_spec
+            JOIN app_products_specification AS spec
+                ON spec.id = product_spec.specification_id
+            WHERE product_spec.product_id = product.id
+        ), '')
+    FROM app_products_product AS product
+'''
+
+DROP_TABLE_SQL = 'DROP TABLE IF EXISTS app_products_productsearch'
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(CREATE_TABLE_SQL)
+        cursor.execute(INDEX_SELECT_SQL)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(DROP_TABLE_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_products', '0009_alter_saleitem_sale_price'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_reviews(apps, schema_editor):
+    Product = apps.get_model('app_products', 'Product')
+    Review = apps.get_model('app_products', 'Review')
+    review_count = (
+        Review.objects
+        .filter(product=OuterRef('pk'))
+        .order_by()
+        .values('product')
+        .annotate(count=Count('pk'))
+        .values('count')
+    )
+    Product.objects.update(review_count=Coalesce(Subquery(review_count), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_products', '0010_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='review_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, verbose_name='number of reviews'),
+        ),
+        migrations.RunPython(count_reviews, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def sum_rates(apps, schema_editor):
+    Product = apps.get_model('app_products', 'Product')
+    Review = apps.get_model('app_products', 'Review')
+    rating_sum = (
+        Review.objects
+        .filter(product=OuterRef('pk'))
+        .order_by()
+        .values('product')
+        .annotate(rate_sum=Sum('rate'))
+        .values('rate_sum')
+    )
+    Product.objects.update(rating_sum=Coalesce(Subquery(rating_sum), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_products', '0011_product_review_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, verbose_name='sum of review rates'),
+        ),
+        migrations.RunPython(sum_rates, migrations.RunPython.noop),
+    ]
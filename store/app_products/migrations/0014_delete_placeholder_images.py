@@ -0,0 +1,29 @@
+from django.db import migrations
+
+DEFAULT_IMAGE_FOR_PRODUCTS = 'images/products/0/empty.jpeg'
+
+
+def delete_placeholder_images(apps, schema_editor):
+    """The serializers show the default image of products without images"""
+    Image = apps.get_model('app_products', 'Image')
+    Image.objects.filter(src=DEFAULT_IMAGE_FOR_PRODUCTS).delete()
+
+
+def create_placeholder_images(apps, schema_editor):
+    Image = apps.get_model('app_products', 'Image')
+    Product = apps.get_model('app_products', 'Product')
+    Image.objects.bulk_create(
+        Image(src=DEFAULT_IMAGE_FOR_PRODUCTS, alt='Empty', product_id=product_id)
+        for product_id in Product.objects.filter(product_image=None).values_list('id', flat=True)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_products', '0013_image_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_placeholder_images, create_placeholder_images),
+    ]
@@ -1,14 +1,27 @@
-import os
-
 from django.db import models
+from django.db.models import F, Case, Count, When, FloatField, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce, Round
 from django.contrib.auth.models import User
 from django.core.validators import MaxValueValidator
-from django.db.models.signals import post_delete, post_save
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, m2m_changed
+)
 from django.dispatch import receiver
+from django.utils import timezone
 
-from app_catalog.models import CatalogItem
+from app_catalog.cache import catalog_cache
+from app_catalog.models import (
+    CatalogItem, mark_rankings_stale, refresh_category_stats
+)
+from app_media.jobs import enqueue_file_deletion, enqueue_processing, stored_paths
+from app_media.variants import needs_variants
+from app_products import search
+from store.conditional import mark_changed
+from store.proxy_cache import purge_products
 
+# shown by the serializers for products without images
 DEFAULT_IMAGE_FOR_PRODUCTS = 'images/products/0/empty.jpeg'
+DEFAULT_IMAGE_ALT = 'no images have been added'
 
 
 class Tag(models.Model):
@@ -38,11 +51,123 @@ class Product(models.Model):
     specifications = models.ManyToManyField(Specification, blank=True)
     category = models.ForeignKey(CatalogItem, on_delete=models.CASCADE, default=1)
     sold = models.PositiveIntegerField(verbose_name='already sold', default=0)
+    review_count = models.PositiveIntegerField(
+        verbose_name='number of reviews', default=0, db_index=True
+    )
+    rating_sum = models.PositiveIntegerField(
+        verbose_name='sum of review rates', default=0
+    )
+
+    # fields of precomputed data (banners, category stats)
+    TRACKED_FIELDS = ('price', 'count', 'category_id')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {
+            field: instance.__dict__.get(field) for field in cls.TRACKED_FIELDS
+        }
+        return instance
+
+    def changed_tracked_fields(self):
+        loaded_values = getattr(self, '_loaded_values', {})
+        return {
+            field for field in self.TRACKED_FIELDS
+            if getattr(self, field) != loaded_values.get(field)
+        }
 
     def __str__(self):
         return f'{self.title}: {self.price}'
 
 
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    search.index_products([instance.pk])
+
+
+@receiver(post_save, sender=Product)
+def refresh_precomputed_data(sender, instance, created, **kwargs):
+    changed = instance.changed_tracked_fields()
+    if created or changed:
+        category_ids = {
+            instance.category_id,
+            getattr(instance, '_loaded_values', {}).get('category_id'),
+        }
+        refresh_category_stats(category_ids)
+        mark_rankings_stale(category_ids)
+    # banners show the minimal price of the category
+    if created or changed & {'price', 'category_id'}:
+        catalog_cache.bump_on_commit()
+
+    instance._loaded_values = {
+        field: getattr(instance, field) for field in Product.TRACKED_FIELDS
+    }
+
+
+@receiver(post_delete, sender=Product)
+def refresh_category_stats_after_delete(sender, instance, **kwargs):
+    refresh_category_stats([instance.category_id])
+    mark_rankings_stale([instance.category_id])
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Product)
+def invalidate_catalog_cache(sender, **kwargs):
+    catalog_cache.bump_on_commit()
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    search.remove_products([instance.pk])
+
+
+def related_product_ids(instance):
+    if not search.is_enabled():
+        return []
+    if isinstance(instance, Tag):
+        return search.products_with_tag(instance.pk)
+    return search.products_with_specification(instance.pk)
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+@receiver(m2m_changed, sender=Product.specifications.through)
+def index_product_relations(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # pk_set is not sent on clear, remember the products to reindex
+        instance._search_product_ids = related_product_ids(instance)
+        return
+
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        search.index_products([instance.pk])
+    elif action == 'post_clear':
+        search.index_products(getattr(instance, '_search_product_ids', []))
+    else:
+        search.index_products(pk_set)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Specification)
+def index_related_products(sender, instance, created, **kwargs):
+    if not created:
+        search.index_products(related_product_ids(instance))
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Specification)
+def remember_indexed_products(sender, instance, **kwargs):
+    instance._search_product_ids = related_product_ids(instance)
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Specification)
+def reindex_products_after_delete(sender, instance, **kwargs):
+    search.index_products(getattr(instance, '_search_product_ids', []))
+
+
 def image_dir_path(instance, filename):
     return f'images/products/{instance.product.id}/{filename}'
 
@@ -59,45 +184,19 @@ class Image(models.Model):
         on_delete=models.CASCADE,
         related_name='product_image'
     )
-
-
-@receiver(post_delete, sender=Image)
-def delete_image_file(sender, instance, **kwargs):
-    if instance.src and instance.src != DEFAULT_IMAGE_FOR_PRODUCTS:
-        image_path = instance.src.path
-        if os.path.isfile(image_path):
-            os.remove(image_path)
-
-    product = instance.product
-    is_more_img = Image.objects.filter(product=product).exists()
-    if not is_more_img:
-        product.product_image.create(
-            src=DEFAULT_IMAGE_FOR_PRODUCTS,
-            alt='no images have been added'
-        )
+    variants = models.JSONField(verbose_name='resized renditions', default=dict, blank=True)
 
 
 @receiver(post_save, sender=Image)
-def delete_empty_image(sender, instance, created, **kwargs):
-    if created:
-        if instance.src != DEFAULT_IMAGE_FOR_PRODUCTS:
-            qs = (
-                Image.objects
-                .filter(product=instance.product)
-                .filter(src=DEFAULT_IMAGE_FOR_PRODUCTS)
-            )
-            if qs.exists():
-                qs.first().delete()
+def queue_image_processing(sender, instance, **kwargs):
+    if instance.src != DEFAULT_IMAGE_FOR_PRODUCTS and needs_variants(instance):
+        enqueue_processing(instance)
 
 
-@receiver(post_save, sender=Product)
-def create_empty_image(sender, instance, created, **kwargs):
-    if created:
-        Image.objects.create(
-            src=DEFAULT_IMAGE_FOR_PRODUCTS,
-            alt='Empty',
-            product=instance
-        )
+@receiver(post_delete, sender=Image)
+def delete_image_file(sender, instance, **kwargs):
+    if instance.src and instance.src != DEFAULT_IMAGE_FOR_PRODUCTS:
+        enqueue_file_deletion(stored_paths(instance))
 
 
 class Review(models.Model):
@@ -113,21 +212,106 @@ class Review(models.Model):
         ordering = ['-date']
 
     def save(self, *args, **kwargs):
+        previous = None
+        if not self._state.adding:
+            previous = (
+                Review.objects
+                .filter(pk=self.pk)
+                .values_list('product_id', 'rate')
+                .first()
+            )
         result = super().save(*args, **kwargs)
-        product_reviews = (
-            Review.objects
-            .filter(product=self.product)
-            .values_list('rate', flat=True)
-        )
-        rate_count = len(product_reviews)
-        sum_rate = sum(product_reviews)
-        rating = round(sum_rate / rate_count, 1)
-        self.product.rating = rating
-        self.product.save()
 
+        rate = int(self.rate)
+        if previous is None:
+            change_product_rating(self.product_id, 1, rate)
+        else:
+            previous_product_id, previous_rate = previous
+            if previous_product_id != self.product_id:
+                change_product_rating(previous_product_id, -1, -previous_rate)
+                change_product_rating(self.product_id, 1, rate)
+            elif previous_rate != rate:
+                change_product_rating(self.product_id, 0, rate - previous_rate)
+
+        self.product.refresh_from_db(fields=['rating', 'rating_sum', 'review_count'])
         return result
 
 
+def change_product_rating(product_id, count_delta, rate_delta):
+    """
+    Apply a review change to the stored counters of the product and
+    recalculate its rating in the same UPDATE, whatever the number of reviews.
+    The rating is kept as it is when the last review is removed.
+    """
+    review_count = F('review_count') + count_delta
+    rating_sum = F('rating_sum') + rate_delta
+    (
+        Product.objects
+        .filter(
+            pk=product_id,
+            review_count__gte=-count_delta,
+            rating_sum__gte=-rate_delta
+        )
+        .update(
+            review_count=review_count,
+            rating_sum=rating_sum,
+            rating=Case(
+                When(
+                    review_count__gt=-count_delta,
+                    then=Round(Cast(rating_sum, FloatField()) / review_count, 1)
+                ),
+                default=F('rating'),
+                output_field=models.DecimalField()
+            )
+        )
+    )
+
+
+@receiver(post_delete, sender=Review)
+def remove_review_rate(sender, instance, **kwargs):
+    change_product_rating(instance.product_id, -1, -instance.rate)
+
+
+def recount_reviews(products=None):
+    """
+    Recompute the stored number of reviews, the sum of their rates and the
+    rating of the products (all of them by default) from their reviews.
+    """
+    if products is None:
+        products = Product.objects.all()
+    reviews = (
+        Review.objects
+        .filter(product=OuterRef('pk'))
+        .order_by()
+        .values('product')
+    )
+    review_count = reviews.annotate(count=Count('pk')).values('count')
+    rating_sum = reviews.annotate(rate_sum=Sum('rate')).values('rate_sum')
+
+    updated = products.update(
+        review_count=Coalesce(Subquery(review_count), 0),
+        rating_sum=Coalesce(Subquery(rating_sum), 0),
+    )
+    (
+        products
+        .filter(review_count__gt=0)
+        .update(rating=Round(
+            Cast('rating_sum', FloatField()) / Cast('review_count', FloatField()), 1
+        ))
+    )
+    mark_changed(Product)
+    return updated
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Review)
+def recount_loaded_reviews(sender, instance, raw, **kwargs):
+    # rows of loaddata skip Review.save() and its counters
+    if raw:
+        product_id = instance.pk if sender is Product else instance.product_id
+        recount_reviews(Product.objects.filter(pk=product_id))
+
+
 class SaleItem(models.Model):
     sale_price = models.DecimalField(
         verbose_name='discounted price', max_digits=10, decimal_places=2
@@ -137,3 +321,63 @@ class SaleItem(models.Model):
     product = models.ForeignKey(
         Product, on_delete=models.CASCADE, related_name='product_sale'
     )
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Specification)
+@receiver(post_save, sender=Image)
+@receiver(post_save, sender=Review)
+@receiver(post_save, sender=SaleItem)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Specification)
+@receiver(post_delete, sender=Image)
+@receiver(post_delete, sender=Review)
+@receiver(post_delete, sender=SaleItem)
+def mark_model_changed(sender, **kwargs):
+    # validators of the conditional GET endpoints
+    mark_changed(sender)
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+@receiver(m2m_changed, sender=Product.specifications.through)
+def mark_product_relations_changed(sender, action, **kwargs):
+    if action.startswith('post_'):
+        mark_changed(Product)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Image)
+@receiver(post_save, sender=Review)
+@receiver(post_save, sender=SaleItem)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Image)
+@receiver(post_delete, sender=Review)
+@receiver(post_delete, sender=SaleItem)
+def purge_product_page(sender, instance, **kwargs):
+    # copies of the product page kept by nginx
+    purge_products([instance.pk if sender is Product else instance.product_id])
+
+
+def current_price(product='pk', price='price'):
+    """
+    Lowest price of the sales of ``product`` running today, or ``price``.
+    Both are field names of the outer query.
+    """
+    today = timezone.localdate()
+    sale_price = (
+        SaleItem.objects
+        .filter(product=OuterRef(product), date_from__lte=today, date_to__gte=today)
+        .order_by('sale_price')
+        .values('sale_price')[:1]
+    )
+    return Coalesce(Subquery(sale_price), F(price))
+
+
+def with_current_price(queryset):
+    """
+    Annotate products with ``current_price``: the lowest price
+    of the sales running today, or the regular price.
+    """
+    return queryset.annotate(current_price=current_price())
@@ -0,0 +1,163 @@
+"""
+Full-text search index for products.
+
+On SQLite the index is an FTS5 virtual table whose rowid is the product id.
+It holds the title, the description, tag names and specification values
+of every product and is kept in sync by the signals in app_products.models.
+Other database backends fall back to a plain ``title__icontains`` lookup.
+"""
+import re
+
+from django.db import connection
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+
+SEARCH_TABLE = 'app_products_productsearch'
+
+# bm25 weights of the columns: title, description, tags, specifications
+COLUMN_WEIGHTS = (10.0, 2.0, 5.0, 1.0)
+
+CHUNK_SIZE = 500
+
+CREATE_TABLE_SQL = f'''
+    CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        title, description, tags, specifications,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+'''
+
+INDEX_SELECT_SQL = f'''
+    INSERT INTO {SEARCH_TABLE} (rowid, title, description, tags, specifications)
+    SELECT
+        product.id,
+        product.title,
+        product.description,
+        COALESCE((
+            SELECT group_concat(tag.name, ' ')
+            FROM app_products_product_tags AS product_tag
+            JOIN app_products_tag AS tag ON tag.id = product_tag.tag_id
+            WHERE product_tag.product_id = product.id
+        ), ''),
+        COALESCE((
+            SELECT group_concat(spec.name || ' ' || spec.value, ' ')
+            FROM app_products_product_specifications AS product_spec
+            JOIN app_products_specification AS spec
+                ON spec.id = product_spec.specification_id
+            WHERE product_spec.product_id = product.id
+        ), '')
+    FROM app_products_product AS product
+'''
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def is_enabled():
+    return connection.vendor == 'sqlite'
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), CHUNK_SIZE):
+        yield ids[start:start + CHUNK_SIZE]
+
+
+def create_index(cursor):
+    cursor.execute(CREATE_TABLE_SQL)
+
+
+def rebuild_index():
+    """Drop every row of the index and fill it again from the product tables"""
+    if not is_enabled():
+        return 0
+
+    with connection.cursor() as cursor:
+        create_index(cursor)
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        cursor.execute(INDEX_SELECT_SQL)
+        cursor.execute(f'SELECT count(*) FROM {SEARCH_TABLE}')
+        return cursor.fetchone()[0]
+
+
+def remove_products(product_ids):
+    if not is_enabled():
+        return
+
+    with connection.cursor() as cursor:
+        for chunk in _chunks(product_ids):
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})',
+                chunk
+            )
+
+
+def index_products(product_ids):
+    """(Re)index the given products with one statement per chunk of ids"""
+    if not is_enabled():
+        return
+
+    remove_products(product_ids)
+    with connection.cursor() as cursor:
+        for chunk in _chunks(product_ids):
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(
+                f'{INDEX_SELECT_SQL} WHERE product.id IN ({placeholders})',
+                chunk
+            )
+
+
+def products_with_tag(tag_id):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT product_id FROM app_products_product_tags WHERE tag_id = %s',
+            [tag_id]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def products_with_specification(specification_id):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT product_id FROM app_products_product_specifications '
+            'WHERE specification_id = %s',
+            [specification_id]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def build_match_query(text: str) -> str:
+    """
+    Turn user input into a safe FTS5 query: every word becomes a quoted
+    prefix term, so partially typed words already match.
+    """
+    words = WORD_RE.findall(text.lower())
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_products(queryset, text: str):
+    """
+    Restrict ``queryset`` to products matching ``text`` and annotate them
+    with ``search_rank`` (lower is more relevant).
+    """
+    if not is_enabled():
+        return queryset.filter(title__icontains=text)
+
+    match = build_match_query(text)
+    if not match:
+        # no word to look for matches no product
+        return queryset.none()
+
+    weights = ', '.join(str(weight) for weight in COLUMN_WEIGHTS)
+    return (
+        queryset
+        .filter(id__in=RawSQL(
+            f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s',
+            (match,)
+        ))
+        .annotate(search_rank=RawSQL(
+            f'SELECT bm25({SEARCH_TABLE}, {weights}) FROM {SEARCH_TABLE} '
+            f'WHERE {SEARCH_TABLE} MATCH %s '
+            f'AND {SEARCH_TABLE}.rowid = app_products_product.id',
+            (match,), output_field=FloatField()
+        ))
+    )
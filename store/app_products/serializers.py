@@ -1,7 +1,10 @@
+from django.core.files.storage import default_storage
 from rest_framework import serializers
 from .models import (
-    Product, Review, Image, Specification, Tag, SaleItem
+    Product, Review, Image, Specification, Tag, SaleItem,
+    DEFAULT_IMAGE_ALT, DEFAULT_IMAGE_FOR_PRODUCTS
 )
+from app_media.serializers import SrcsetField
 
 
 class SpecificationSerializer(serializers.ModelSerializer):
@@ -18,11 +21,28 @@ class TagSerializer(serializers.ModelSerializer):
         fields = ['name']
 
 
+def default_image(request=None):
+    src = default_storage.url(DEFAULT_IMAGE_FOR_PRODUCTS)
+    if request is not None:
+        src = request.build_absolute_uri(src)
+    return {'src': src, 'alt': DEFAULT_IMAGE_ALT, 'srcset': {}}
+
+
+class ImageListSerializer(serializers.ListSerializer):
+    """Images of a product, or the default image when it has none"""
+
+    def to_representation(self, data):
+        representation = super().to_representation(data)
+        return representation or [default_image(self.context.get('request'))]
+
+
 class ImageSerializer(serializers.ModelSerializer):
+    srcset = SrcsetField()
 
     class Meta:
         model = Image
-        fields = ['src', 'alt']
+        fields = ['src', 'alt', 'srcset']
+        list_serializer_class = ImageListSerializer
 
 
 class ReviewSerializer(serializers.ModelSerializer):
@@ -56,7 +76,7 @@ class ReviewSerializer(serializers.ModelSerializer):
 class ProductSerializer(serializers.ModelSerializer):
     date = serializers.DateTimeField(format='%a %b %d %Y %H:%M:%S GMT%z (%Z)')
     images = ImageSerializer(many=True, read_only=True, source='product_image')
-    reviews = ReviewSerializer(many=True, read_only=True, source='review_set')
+    reviews = serializers.SerializerMethodField()
     specifications = SpecificationSerializer(many=True, read_only=True)
     tags = TagSerializer(many=True, read_only=True)
 
@@ -68,6 +88,13 @@ class ProductSerializer(serializers.ModelSerializer):
             'specifications', 'tags', 'images', 'reviews'
         ]
 
+    def get_reviews(self, instance):
+        # the first page of reviews when the view prefetched it
+        reviews = getattr(instance, 'latest_reviews', None)
+        if reviews is None:
+            reviews = instance.review_set.all()
+        return ReviewSerializer(reviews, many=True).data
+
     def to_representation(self, instance):
         representation = super().to_representation(instance)
 
@@ -113,11 +140,7 @@ class SalesSerializer(serializers.ModelSerializer):
         ]
 
     def get_images(self, instance):
-        list_serializers = []
-        for image in instance.product.product_image.all():
-            serializer = ImageSerializer(image)
-            list_serializers.append(serializer.data)
-        return list_serializers
+        return ImageSerializer(instance.product.product_image.all(), many=True).data
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
@@ -1,14 +1,17 @@
 import os
+from io import StringIO
 
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from rest_framework.test import APITestCase
 
 
 from app_products.models import (
-    Product, DEFAULT_IMAGE_FOR_PRODUCTS, Image, Review
+    Product, DEFAULT_IMAGE_ALT, DEFAULT_IMAGE_FOR_PRODUCTS, Image, Review
 )
+from app_products.serializers import ProductSerializer
 from app_catalog.models import CatalogItem
 
 
@@ -51,18 +54,20 @@ class ProductTest(APITestCase):
 
     def test_default_image_adding(self):
         """
-        Test to check the creation of a default image for a new product with right path to file
+        Test that a new product gets no image rows and is shown with the default image
         """
-        image_qs = Image.objects.filter(product=self.product)
-        self.assertTrue(image_qs.exists(), msg='No images for created product')
-        image = image_qs.first()
-        self.assertEqual(image.src, DEFAULT_IMAGE_FOR_PRODUCTS)
-        self.assertEqual(image.alt, 'Empty')
+        self.assertFalse(Image.objects.filter(product=self.product).exists())
+        images = ProductSerializer(self.product).data['images']
+        self.assertEqual(images, [{
+            'src': settings.MEDIA_URL + DEFAULT_IMAGE_FOR_PRODUCTS,
+            'alt': DEFAULT_IMAGE_ALT,
+            'srcset': {},
+        }])
 
     def test_uploading_and_deleting_file(self):
         """
-        Test to check that the default image was deleted after upload,
-        that the default image was added, and that the file was deleted
+        Test to check that the default image is replaced by an upload,
+        that it is shown again after deletion, and that the file was deleted
         form directory after deletion.
         Also deletes the test file from the directory in any case.
         """
@@ -75,20 +80,19 @@ class ProductTest(APITestCase):
             )
             self.assertEqual(image.src.name, path_file)
 
-            # check that default image was deleted
-            images_qs = Image.objects.filter(product=self.product)
-            self.assertEqual(len(images_qs), 1)
-            image_from_qs = images_qs.first()
-            self.assertEqual(image_from_qs.alt, 'test image')
+            images = ProductSerializer(self.product).data['images']
+            self.assertEqual(len(images), 1)
+            self.assertEqual(images[0]['alt'], 'test image')
 
-            # check autocreation default after deleting
-            image.delete()
-            images_qs = Image.objects.filter(product=self.product)
-            self.assertEqual(len(images_qs), 1)
-            image_from_qs = images_qs.first()
-            self.assertEqual(image_from_qs.alt, 'no images have been added')
+            # check the default image after deleting
+            with self.captureOnCommitCallbacks(execute=True):
+                image.delete()
+            self.assertFalse(Image.objects.filter(product=self.product).exists())
+            images = ProductSerializer(self.product).data['images']
+            self.assertEqual(images[0]['alt'], DEFAULT_IMAGE_ALT)
 
-            # check deleting file form directory
+            # check deleting file form directory by the image worker
+            call_command('process_image_jobs', once=True, stdout=StringIO())
             image_path = os.path.join(settings.MEDIA_ROOT, path_file)
             self.assertFalse(os.path.isfile(image_path))
 
@@ -118,3 +122,78 @@ class ProductTest(APITestCase):
             product=self.product
         )
         self.assertEqual(self.product.rating, 3)
+
+    def test_review_count(self):
+        """
+        Test that the stored number of reviews follows creation and deletion
+        of reviews and can be recomputed by the command
+        """
+        reviews = [
+            Review.objects.create(
+                text='TestText', rate=5, user=self.user, product=self.product
+            )
+            for _ in range(3)
+        ]
+        self.assertEqual(self.product.review_count, 3)
+
+        reviews[0].delete()
+        Review.objects.filter(pk=reviews[1].pk).delete()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.review_count, 1)
+
+        Product.objects.filter(pk=self.product.pk).update(
+            review_count=42, rating_sum=0, rating=1
+        )
+        call_command('recount_reviews', stdout=StringIO())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.review_count, 1)
+        self.assertEqual(self.product.rating_sum, 5)
+        self.assertEqual(self.product.rating, 5)
+
+    def test_review_counters_of_fixtures(self):
+        """Test that loaddata leaves the review counters in step with the reviews"""
+        call_command('loaddata', 'show_fixtures', verbosity=0)
+        product = Product.objects.get(pk=1)
+        self.assertEqual(product.review_count, 2)
+        self.assertEqual(product.rating_sum, 8)
+        self.assertEqual(product.rating, 4)
+
+    def test_rating_follows_review_changes(self):
+        """
+        Test that editing and deleting reviews update the rating and that
+        writing a review costs the same number of queries for any number of reviews
+        """
+        review_1 = Review.objects.create(
+            text='TestText', rate=5, user=self.user, product=self.product
+        )
+        review_2 = Review.objects.create(
+            text='TestText', rate=3, user=self.user, product=self.product
+        )
+        self.assertEqual(self.product.rating, 4)
+        self.assertEqual(self.product.rating_sum, 8)
+
+        review_2.rate = 4
+        review_2.save()
+        self.assertEqual(self.product.rating, 4.5)
+        self.assertEqual(self.product.review_count, 2)
+
+        review_1.delete()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.rating, 4)
+        self.assertEqual(self.product.rating_sum, 4)
+
+        # the rating stays as it is without reviews
+        review_2.delete()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.rating, 4)
+        self.assertEqual(self.product.review_count, 0)
+
+        for _ in range(20):
+            Review.objects.create(
+                text='TestText', rate=1, user=self.user, product=self.product
+            )
+        with self.assertNumQueries(3):
+            Review.objects.create(
+                text='TestText', rate=1, user=self.user, product=self.product
+            )
+        self.assertEqual(self.product.rating, 1)
@@ -1,13 +1,31 @@
-from datetime import date
+import json
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from unittest import mock
 
+from django.conf import settings
+from django.core.checks import run_checks
+from django.test import override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase, APIClient
 from django.contrib.auth.models import User
 from app_products.models import Product, Review, SaleItem, Tag, CatalogItem
+from app_products.views import ProductViewSet
+from app_catalog.cache import catalog_cache
+from store.json_api import ORJSONRenderer
+from store.proxy_cache import PurgedPaths
+from store.testing import QueryBudgetMixin
 
+SHARED_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:6379',
+    },
+}
 
-class ProductViewSetTest(APITestCase):
+
+class ProductViewSetTest(QueryBudgetMixin, APITestCase):
 
     @classmethod
     def setUpClass(cls):
@@ -63,6 +81,178 @@ class ProductViewSetTest(APITestCase):
         self.assertIsInstance(response.data['images'], list)
         self.assertIsInstance(response.data['reviews'], list)
 
+    def test_product_reviews_pages(self):
+        """Test that product reviews are capped and loaded further with a cursor"""
+        product = Product.objects.create(
+            price=10, count=1, title='reviewed product', description='Reviewed',
+            rating=0, category=self.category
+        )
+        for number in range(12):
+            user = User.objects.create_user(username=f'Reviewer{number}')
+            Review.objects.create(
+                product=product, user=user, text=f'Review {number}', rate=5
+            )
+
+        response = self.client.get(f'/api/product/{product.id}/')
+        reviews = response.data['reviews']
+        self.assertEqual(len(reviews), 10)
+        self.assertEqual(reviews[0]['text'], 'Review 11')
+        self.assertEqual(reviews[0]['author'], 'Reviewer11')
+
+        next_link = response['Link']
+        self.assertTrue(next_link.endswith('; rel="next"'))
+        next_url = next_link[1:next_link.index('>')]
+        response = self.client.get(next_url)
+        self.assertEqual(
+            [review['text'] for review in response.data['items']],
+            ['Review 1', 'Review 0']
+        )
+        self.assertIsNone(response.data['nextCursor'])
+
+        response = self.client.get(f'/api/product/{self.product.id}/')
+        self.assertNotIn('Link', response)
+
+    def test_orjson_renderer(self):
+        """Test the orjson renderer of the API and its output of Decimal and datetime"""
+        response = self.client.get(f'/api/product/{self.product.id}/')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(json.loads(response.content)['price'], 99.99)
+
+        content = ORJSONRenderer().render({
+            'price': Decimal('10.50'),
+            'date': datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+            'text': 'line\u2028break',
+            1: None,
+        })
+        self.assertEqual(
+            content,
+            b'{"price":10.5,"date":"2024-01-02T03:04:05Z","text":"line\\u2028break","1":null}'
+        )
+
+    def test_conditional_get(self):
+        """Test ETag, Last-Modified and 304 responses of read-mostly endpoints"""
+        response = self.client.get('/api/tags/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('max-age=', response['Cache-Control'])
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+        response = self.client.get(
+            '/api/tags/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # the tags cached with the new one must not outlive this test
+        self.addCleanup(catalog_cache.bump)
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name='New tag')
+        response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+        url = f'/api/product/{self.product.id}/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+            status.HTTP_304_NOT_MODIFIED
+        )
+        Product.objects.filter(pk=self.product.pk).update(count=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # markers in the memory of each process are reported
+        self.assertIn('store.W001', [message.id for message in run_checks()])
+        with override_settings(CACHES=SHARED_CACHES):
+            self.assertNotIn('store.W001', [message.id for message in run_checks()])
+
+    def test_conditional_get_review_authors(self):
+        """Test that product pages change with the names of their review authors"""
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(product=self.product, user=self.user, text='Fine', rate=5)
+        url = f'/api/product/{self.product.id}/'
+        etag = self.client.get(url)['ETag']
+
+        # signing in only updates last_login
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save(update_fields=['last_login'])
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+            status.HTTP_304_NOT_MODIFIED
+        )
+
+        self.user.first_name = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['reviews'][0]['author'], 'Renamed')
+
+    def test_proxy_cache(self):
+        """Test the headers of the proxy cache mode and the paths purged on changes"""
+        proxy_cache = {
+            **settings.PROXY_CACHE, 'ENABLED': True,
+            'REFRESH_URL': 'http://nginx:8080', 'HOSTS': ['store.example'],
+        }
+        url = f'/api/product/{self.product.id}/'
+        with self.settings(PROXY_CACHE=proxy_cache):
+            response = self.client.get('/api/products/popular/')
+            self.assertEqual(
+                response['Cache-Control'],
+                f'public, max-age={proxy_cache["MAX_AGE"]}'
+            )
+            self.assertIn('Cookie', response['Vary'])
+
+            self.client.login(username=self.user.username, password=self.password)
+            response = self.client.get('/api/products/popular/')
+            self.assertIn('private', response['Cache-Control'])
+            self.assertNotIn('public', response['Cache-Control'])
+            self.client.logout()
+
+            with mock.patch.object(PurgedPaths, 'run') as run, \
+                    self.captureOnCommitCallbacks(execute=True):
+                SaleItem.objects.create(
+                    product=self.product, sale_price=1,
+                    date_from=date.today(), date_to=date.today()
+                )
+            run.assert_called_once()
+            self.assertEqual(
+                set(run.call_args.args[0]), {url, '/api/sales/?currentPage=1'}
+            )
+
+        with mock.patch.object(PurgedPaths, 'run') as run, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        run.assert_not_called()
+
+    @override_settings(QUERY_BUDGET={'HEADERS': True})
+    def test_query_budget(self):
+        """Test query headers and the failure of requests over the view budget"""
+        response = self.client.get(f'/api/product/{self.product.id}/')
+        self.assertLessEqual(
+            int(response['X-Query-Count']), ProductViewSet.query_budget
+        )
+        self.assertIn('X-Query-Time', response)
+        self.assertEqual(response['X-Duplicate-Queries'], '0')
+
+        with mock.patch.object(ProductViewSet, 'query_budget', 1):
+            with self.assertRaisesMessage(AssertionError, 'the budget is 1'):
+                self.client.get(f'/api/product/{self.product.id}/')
+
+        # without headers nor debug logging the queries are only counted
+        query_budget = {**settings.QUERY_BUDGET, 'HEADERS': False}
+        with override_settings(QUERY_BUDGET=query_budget), \
+                mock.patch('store.query_budget.fingerprint') as fingerprint:
+            response = APIClient().get(f'/api/product/{self.product.id}/')
+        self.assertNotIn('X-Query-Count', response)
+        fingerprint.assert_not_called()
+
     def test_create_review_authenticated(self):
         """Test creation(post) review view for authenticated user"""
 
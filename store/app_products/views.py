@@ -1,3 +1,5 @@
+from django.db.models import Prefetch
+from django.urls import reverse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
@@ -5,17 +7,78 @@ from rest_framework.generics import ListAPIView
 from rest_framework.pagination import PageNumberPagination
 
 from .serializers import (
-    ProductSerializer, SalesSerializer, TagsSerializer
+    ProductSerializer, ReviewSerializer, SalesSerializer, TagsSerializer
 )
 from .models import Product, Review, SaleItem, Tag
+from app_catalog.cache import catalog_cache
+from app_catalog.views import SeekPagination
+from store.conditional import ConditionalGetMixin
 
 
-class ProductViewSet(ModelViewSet):
-    queryset = Product.objects.all()
+class ReviewsPagination(SeekPagination):
+    """Newest reviews first, the next ones are loaded with the cursor"""
+    page_size = 10
+    max_page_size = 50
+
+    ordered_reviews = Review.objects.select_related('user').order_by('-date', '-id')
+
+    @classmethod
+    def get_reviews(cls, product_id):
+        return cls.ordered_reviews.filter(product_id=product_id)
+
+    def get_next_link(self, request, product, reviews):
+        """Link to the reviews after the ones embedded in the product"""
+        if product.review_count <= len(reviews) or not reviews:
+            return None
+        self.ordering = self.get_ordering(self.ordered_reviews)
+        url = reverse('make_review', kwargs={'pk': product.id})
+        return request.build_absolute_uri(
+            f'{url}?{self.cursor_query_param}={self.encode_cursor(reviews[-1])}'
+        )
+
+
+class ProductViewSet(ConditionalGetMixin, ModelViewSet):
+    query_budget = 5
+    conditional_models = (
+        'app_products.Product', 'app_products.Image', 'app_products.Tag',
+        'app_products.Specification', 'app_products.Review', 'auth.User',
+    )
+    queryset = Product.objects.prefetch_related(
+        'product_image', 'tags', 'specifications',
+        Prefetch(
+            'review_set',
+            queryset=ReviewsPagination.ordered_reviews[:ReviewsPagination.page_size],
+            to_attr='latest_reviews'
+        ),
+    )
     serializer_class = ProductSerializer
 
+    def retrieve(self, request, *args, **kwargs):
+        """
+        The product with its first page of reviews,
+        the next page is announced in the Link header.
+        """
+        product = self.get_object()
+        serializer = self.get_serializer(product)
+        headers = {}
+        next_link = ReviewsPagination().get_next_link(
+            request, product, product.latest_reviews
+        )
+        if next_link:
+            headers['Link'] = f'<{next_link}>; rel="next"'
+        return Response(serializer.data, headers=headers)
+
 
 class ReviewAPIView(APIView):
+    query_budget = {'get': 2, 'post': 7}
+
+    def get(self, request, pk):
+        paginator = ReviewsPagination()
+        reviews = paginator.paginate_queryset(
+            paginator.get_reviews(pk), request, view=self
+        )
+        serializer = ReviewSerializer(reviews, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
     def post(self, request, pk):
         queryset = Product.objects.filter(id=pk)
@@ -46,7 +109,9 @@ class SalesPagination(PageNumberPagination):
         })
 
 
-class SalesAPIView(ListAPIView):
+class SalesAPIView(ConditionalGetMixin, ListAPIView):
+    query_budget = 3
+    conditional_models = ('app_products.SaleItem', 'app_products.Product', 'app_products.Image')
     serializer_class = SalesSerializer
     pagination_class = SalesPagination
 
@@ -60,6 +125,15 @@ class SalesAPIView(ListAPIView):
         return queryset
 
 
-class TagsAPIView(ListAPIView):
+class TagsAPIView(ConditionalGetMixin, ListAPIView):
+    query_budget = 1
+    conditional_models = ('app_products.Tag',)
     queryset = Tag.objects.all()
     serializer_class = TagsSerializer
+
+    def list(self, request, *args, **kwargs):
+        return Response(catalog_cache.get_or_set('tags', self.build_tags))
+
+    def build_tags(self):
+        serializer = self.get_serializer(self.get_queryset(), many=True)
+        return serializer.data
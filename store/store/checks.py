@@ -0,0 +1,9 @@
+"""Helpers of the system checks of the apps"""
+from django.conf import settings
+
+LOCMEM_CACHE = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+def is_local_memory(alias):
+    """The cache ``alias`` lives in each process, unseen by the others"""
+    return settings.CACHES.get(alias, {}).get('BACKEND') == LOCMEM_CACHE
@@ -0,0 +1,129 @@
+"""
+Conditional GET for read-mostly endpoints.
+
+Every tracked model has a change marker in the shared cache: the time (ns)
+of its last change, set by the save/delete signals of the apps and by the
+code updating rows in bulk (``mark_changed``). A view lists the models its
+responses are built from::
+
+    class TagsAPIView(ConditionalGetMixin, ListAPIView):
+        conditional_models = ('app_products.Tag',)
+
+GET responses get a weak ETag made of the markers and of the request
+(URL, host, Accept) and a Last-Modified of the latest marker. A request
+with a matching If-None-Match or If-Modified-Since gets its 304 before the
+view runs, without queries or serializers. Successful responses carry
+``Cache-Control: public, max-age=CONDITIONAL_GET['MAX_AGE']`` so a proxy
+cache can keep them and revalidate them with the same headers.
+
+The same changes purge the copies kept by nginx (store.proxy_cache).
+
+As for the catalog cache, the markers must live in a cache shared by all
+the workers and commands (CONDITIONAL_GET['ALIAS']), the store.W001 check
+warns about a local memory one.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.checks import Warning, register
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from store.checks import is_local_memory
+from store.proxy_cache import purge_models
+from store.transactions import OnCommitBatch
+
+KEY_PREFIX = 'changes:'
+
+
+def model_label(model):
+    return model if isinstance(model, str) else model._meta.label
+
+
+@register()
+def check_markers_cache(app_configs, **kwargs):
+    """Markers set by one process must be seen by all of them"""
+    alias = settings.CONDITIONAL_GET['ALIAS']
+    if is_local_memory(alias):
+        return [Warning(
+            f"Change markers are kept in the local memory cache '{alias}'.",
+            hint=(
+                'Changes made by the other workers and by the management commands '
+                'are not seen and clients get 304 for stale data: set '
+                'DJANGO_CACHE_BACKEND to a shared cache (e.g. RedisCache).'
+            ),
+            id='store.W001',
+        )]
+    return []
+
+
+def get_changes(models):
+    """Change markers of the models by label, a missing one starts now"""
+    cache = caches[settings.CONDITIONAL_GET['ALIAS']]
+    keys = {KEY_PREFIX + model_label(model): model_label(model) for model in models}
+    markers = cache.get_many(keys)
+    for key in keys.keys() - markers.keys():
+        cache.add(key, time.time_ns(), timeout=None)
+        markers[key] = cache.get(key)
+    return {keys[key]: marker for key, marker in markers.items()}
+
+
+def set_changed(labels):
+    cache = caches[settings.CONDITIONAL_GET['ALIAS']]
+    now = time.time_ns()
+    cache.set_many({KEY_PREFIX + label: now for label in labels}, timeout=None)
+
+
+class ChangedModels(OnCommitBatch):
+    """Labels of the models changed in one transaction"""
+
+    def run(self, items):
+        labels = set(items)
+        set_changed(labels)
+        purge_models(*labels)
+
+
+def mark_changed(*models):
+    """
+    Mark the models changed when the transaction commits: responses read
+    before cannot be kept as current, and rows changed one by one in the
+    transaction cost one mark per model.
+    """
+    ChangedModels.add(model_label(model) for model in models)
+
+
+def last_modified(changes):
+    return datetime.fromtimestamp(max(changes.values()) / 1e9, tz=timezone.utc)
+
+
+def make_etag(request, changes):
+    digest = hashlib.sha1()
+    digest.update(request.build_absolute_uri().encode())
+    digest.update(request.META.get('HTTP_ACCEPT', '').encode())
+    for label, marker in sorted(changes.items()):
+        digest.update(f'{label}={marker};'.encode())
+    return f'W/"{digest.hexdigest()}"'
+
+
+class ConditionalGetMixin:
+    """ETag, Last-Modified and Cache-Control of GET responses (see above)"""
+    conditional_models = ()
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or not self.conditional_models:
+            return super().dispatch(request, *args, **kwargs)
+
+        changes = get_changes(self.conditional_models)
+        conditional_view = condition(
+            etag_func=lambda request, *args, **kwargs: make_etag(request, changes),
+            last_modified_func=lambda request, *args, **kwargs: last_modified(changes),
+        )(super().dispatch)
+        response = conditional_view(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            patch_cache_control(
+                response, public=True, max_age=settings.CONDITIONAL_GET['MAX_AGE']
+            )
+        return response
@@ -0,0 +1,104 @@
+"""
+Micro-caching of anonymous catalog traffic by nginx (nginx/nginx.template).
+
+With PROXY_CACHE['ENABLED'] the middleware marks the GET responses of the
+PROXY_CACHE['PATHS'] prefixes a shared cache may keep:
+
+- requests without a session cookie get ``Cache-Control: public`` with
+  PROXY_CACHE['MAX_AGE'] when the view set no max-age, and ``Vary: Cookie``;
+- requests with one, and responses setting cookies, are private.
+
+nginx keeps the public ones for their max-age. When products, sales or
+categories change, the purge hook refreshes the cached copies of the
+affected paths once the transaction commits: open source nginx has no purge,
+so it requests them again, for each of PROXY_CACHE['HOSTS'], through the
+internal server of the template (PROXY_CACHE['REFRESH_URL']) which bypasses
+the cache and stores the new response. Paths with other query strings
+(filters, pages) expire with their max-age.
+"""
+import logging
+import threading
+from urllib.error import URLError
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+from store.transactions import OnCommitBatch
+
+logger = logging.getLogger(__name__)
+
+
+def is_cacheable_path(path):
+    return path.startswith(tuple(settings.PROXY_CACHE['PATHS']))
+
+
+class ProxyCacheMiddleware:
+    """Cache-Control and Vary of the API responses (see above)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            not settings.PROXY_CACHE['ENABLED']
+            or request.method not in ('GET', 'HEAD')
+            or not is_cacheable_path(request.path)
+        ):
+            return response
+
+        anonymous = settings.SESSION_COOKIE_NAME not in request.COOKIES
+        if anonymous and response.status_code in (200, 304) and not response.cookies:
+            if 'max-age' not in response.get('Cache-Control', ''):
+                patch_cache_control(
+                    response, public=True, max_age=settings.PROXY_CACHE['MAX_AGE']
+                )
+        else:
+            patch_cache_control(response, private=True)
+        patch_vary_headers(response, ('Cookie',))
+        return response
+
+
+def refresh(paths):
+    """Request the paths of every host through the refreshing server of nginx"""
+    for host in settings.PROXY_CACHE['HOSTS']:
+        for path in paths:
+            request = Request(
+                settings.PROXY_CACHE['REFRESH_URL'].rstrip('/') + path,
+                headers={'Host': host, 'Accept': 'application/json'},
+            )
+            try:
+                with urlopen(request, timeout=settings.PROXY_CACHE['TIMEOUT']) as response:
+                    response.read()
+            except (URLError, OSError) as error:
+                logger.warning('Proxy cache refresh of %s%s failed: %s', host, path, error)
+
+
+class PurgedPaths(OnCommitBatch):
+    """Paths changed in one transaction, refreshed once it commits"""
+
+    def run(self, items):
+        paths = list(dict.fromkeys(items))
+        # in a thread: the worker may be the one nginx proxies them to
+        threading.Thread(target=refresh, args=(paths,), daemon=True).start()
+
+
+def purge(*paths):
+    config = settings.PROXY_CACHE
+    if config['ENABLED'] and config['REFRESH_URL'] and config['HOSTS']:
+        PurgedPaths.add(paths)
+
+
+def purge_models(*models):
+    """Purge the paths of PROXY_CACHE['PURGE'] built from the changed models"""
+    labels = {model if isinstance(model, str) else model._meta.label for model in models}
+    purge(*(
+        path
+        for label, paths in settings.PROXY_CACHE['PURGE'].items() if label in labels
+        for path in paths
+    ))
+
+
+def purge_products(product_ids):
+    purge(*(f'/api/product/{product_id}/' for product_id in product_ids))
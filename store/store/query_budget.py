@@ -0,0 +1,135 @@
+"""
+Per-request SQL instrumentation.
+
+QueryBudgetMiddleware records every query of a request: their number, the
+total SQL time and the fingerprints of repeated queries (the same statement
+executed again with other parameters is the usual sign of an N+1 problem).
+The numbers are logged and, when QUERY_BUDGET['HEADERS'] is on, returned
+as X-Query-Count, X-Query-Time and X-Duplicate-Queries response headers.
+
+A view declares its budget next to its class::
+
+    class ProductViewSet(viewsets.ReadOnlyModelViewSet):
+        query_budget = 6
+
+Requests over the budget are logged as warnings, and make the tests fail
+when they are sent by store.testing.QueryBudgetMixin.
+"""
+import logging
+import re
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger('store.queries')
+
+IN_LIST_RE = re.compile(r'\bIN \((?:%s, )*%s\)')
+NUMBER_RE = re.compile(r'\b\d+\b')
+SPACES_RE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """SQL statement with its parameters and literals left out"""
+    sql = SPACES_RE.sub(' ', sql).strip()
+    sql = IN_LIST_RE.sub('IN (...)', sql)
+    return NUMBER_RE.sub('N', sql)
+
+
+class QueryRecorder:
+    """Context manager recording the queries of the default connection"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    def __enter__(self):
+        self._wrapper = connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def time(self):
+        return sum(duration for _, duration in self.queries)
+
+    def duplicates(self):
+        """Fingerprints executed more than once, with their number of executions"""
+        counter = Counter(fingerprint(sql) for sql, _ in self.queries)
+        return {sql: number for sql, number in counter.items() if number > 1}
+
+    def duplicate_count(self, duplicates=None):
+        if duplicates is None:
+            duplicates = self.duplicates()
+        return sum(number - 1 for number in duplicates.values())
+
+
+def get_query_budget(view_class, method):
+    """
+    ``query_budget`` of the view: a number, or a dict by
+    lowercase HTTP method, e.g. ``{'get': 4, 'post': 10}``.
+    """
+    budget = getattr(view_class, 'query_budget', None)
+    if isinstance(budget, dict):
+        budget = budget.get(method.lower())
+    return budget
+
+
+class QueryBudgetMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.headers = settings.QUERY_BUDGET['HEADERS']
+
+    def __call__(self, request):
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+
+        view_class = getattr(request, 'query_budget_view', None)
+        budget = get_query_budget(view_class, request.method)
+        response.query_recorder = recorder
+        response.query_budget = budget
+
+        over_budget = budget is not None and recorder.count > budget
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if not (self.headers or over_budget or debug):
+            # nothing is reported, the queries are not fingerprinted
+            return response
+
+        duplicates = recorder.duplicates()
+        duplicate_count = recorder.duplicate_count(duplicates)
+        if self.headers:
+            response['X-Query-Count'] = recorder.count
+            response['X-Query-Time'] = f'{recorder.time * 1000:.2f}'
+            response['X-Duplicate-Queries'] = duplicate_count
+
+        if over_budget or debug:
+            log = logger.warning if over_budget else logger.debug
+            log(
+                '%s %s: %s queries (budget %s), %.2f ms, %s duplicates',
+                request.method, request.path, recorder.count, budget,
+                recorder.time * 1000, duplicate_count
+            )
+        if debug:
+            for sql, number in duplicates.items():
+                logger.debug('%s x %s', number, sql)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # class based views keep their class on the function made by as_view()
+        request.query_budget_view = getattr(view_func, 'cls', None) or getattr(
+            view_func, 'view_class', None
+        )
@@ -60,10 +60,13 @@ INSTALLED_APPS = [
     'app_catalog.apps.AppCatalogConfig',
     'app_basket.apps.AppBasketConfig',
     'app_order.apps.AppOrderConfig',
+    'app_media.apps.AppMediaConfig',
 
 ]
 
 MIDDLEWARE = [
+    'store.query_budget.QueryBudgetMiddleware',
+    'store.proxy_cache.ProxyCacheMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -99,14 +102,133 @@ WSGI_APPLICATION = 'store.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
+# DJANGO_DATABASE_PROFILE=production when several workers share the file:
+# WAL, waits for locks, write lock taken at BEGIN, persistent connections
+# (store.sqlite_backend). The benchmark_sqlite_contention command compares them.
+DATABASE_PROFILES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
+    },
+    'production': {
+        'ENGINE': 'store.sqlite_backend',
+        'CONN_MAX_AGE': 10 * 60,
+        'CONN_HEALTH_CHECKS': True,
+        'PRAGMAS': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'busy_timeout': 5000,
+            'mmap_size': 256 * 1024 * 1024,
+            'cache_size': -64 * 1024,  # KiB
+            'temp_store': 'MEMORY',
+        },
+        'TRANSACTION_MODE': 'IMMEDIATE',
+    },
+}
+
+DATABASES = {
+    'default': {
         'NAME': os.path.join(DATABASE_DIR, 'db.sqlite3'),
+        **DATABASE_PROFILES[os.getenv('DJANGO_DATABASE_PROFILE') or 'default'],
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': (
+            os.getenv('DJANGO_CACHE_BACKEND')
+            or 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('DJANGO_CACHE_LOCATION', ''),
+    }
+}
+
+# Versioned cache of categories, tags and banners (app_catalog.cache)
+CATALOG_CACHE = {
+    'ALIAS': 'default',
+    'LOCAL_MAXSIZE': 64,
+    'TIMEOUT': 60 * 60,
+}
+
+# Change markers of the conditional GET endpoints (store.conditional)
+CONDITIONAL_GET = {
+    'ALIAS': 'default',
+    'MAX_AGE': int(os.getenv('DJANGO_CONDITIONAL_MAX_AGE') or 10),
+}
+
+# Micro-caching of anonymous API responses by nginx (store.proxy_cache),
+# REFRESH_URL is the internal server of nginx/nginx.template
+PROXY_CACHE = {
+    'ENABLED': os.getenv('DJANGO_PROXY_CACHE', '0') == '1',
+    'MAX_AGE': 5,
+    'REFRESH_URL': os.getenv('DJANGO_PROXY_CACHE_REFRESH_URL', ''),
+    # hosts the site is served under, nginx keeps a copy for each
+    'HOSTS': [host for host in os.getenv('DJANGO_PROXY_CACHE_HOSTS', '').split(',') if host],
+    'TIMEOUT': 5,
+    'PATHS': [
+        '/api/categories/', '/api/catalog/', '/api/products/', '/api/banners/',
+        '/api/sales/', '/api/tags/', '/api/product/',
+    ],
+    # paths requested by the frontend, refreshed when the models change
+    'PURGE': {
+        'app_catalog.CatalogItem': ['/api/categories/', '/api/banners/'],
+        'app_catalog.Image': ['/api/categories/', '/api/banners/'],
+        'app_catalog.CategoryStats': ['/api/banners/'],
+        'app_products.Product': [
+            '/api/products/popular/', '/api/products/limited/', '/api/sales/?currentPage=1',
+        ],
+        'app_products.Image': [
+            '/api/products/popular/', '/api/products/limited/', '/api/sales/?currentPage=1',
+        ],
+        'app_products.SaleItem': ['/api/sales/?currentPage=1'],
+        'app_products.Tag': ['/api/tags/'],
+    },
+}
+
+# Resized renditions of uploaded images (app_media.variants)
+IMAGE_VARIANTS = {
+    'WIDTHS': [160, 320, 640, 1280],
+    'FORMATS': ['webp', 'jpeg'],
+    'QUALITY': 80,
+}
+
+# Image work run by the process_image_jobs command (app_media.jobs)
+IMAGE_JOBS = {
+    'MAX_WIDTH': 2560,
+    'MAX_ATTEMPTS': 3,
+    'STALE_AFTER': 10 * 60,
+    'BATCH': 20,
+}
+
+# Per-request SQL instrumentation (store.query_budget)
+QUERY_BUDGET = {
+    'HEADERS': DEBUG or os.getenv('DJANGO_QUERY_HEADERS', '0') == '1',
+}
+
+# Baskets of anonymous users (app_basket.storage), kept in the database by
+# default; ALIAS is the cache of CacheBasketStorage and RedisBasketStorage,
+# which must be shared by all workers and not culled (check app_basket.W001)
+BASKET_STORAGE = {
+    'BACKEND': os.getenv(
+        'DJANGO_BASKET_STORAGE', 'app_basket.storage.DatabaseBasketStorage'
+    ),
+    'ALIAS': 'default',
+    'TIMEOUT': 14 * 24 * 60 * 60,
+}
+
+# Orders left in 'Products selected' give their stock back after (seconds)
+ORDER_RESERVATION_TIMEOUT = 30 * 60
+
+# Stored tops of products on the main page (app_catalog.rankings)
+RANKINGS = {
+    'SIZE': 8,
+    'TTL': 5 * 60,
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -162,7 +284,15 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
-
+    'DEFAULT_RENDERER_CLASSES': [
+        'store.json_api.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'store.json_api.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 
@@ -194,6 +324,11 @@ LOGGING = {
         'django.db.backends': {
             'level': LOGLEVEL,
             'handlers': ['console'],
-        }
+        },
+        'store.queries': {
+            'level': LOGLEVEL,
+            'handlers': ['console'],
+            'propagate': False,
+        },
     },
 }
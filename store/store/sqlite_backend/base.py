@@ -0,0 +1,27 @@
+"""
+SQLite backend of the production database profile (DATABASE_PROFILES).
+
+New connections run the PRAGMAS of the database settings: WAL lets readers
+work while a transaction writes, the busy timeout makes writers wait for
+the lock instead of failing with "database is locked".
+
+Transactions start with ``BEGIN <TRANSACTION_MODE>``. A deferred transaction
+which reads before it writes cannot wait for a busy lock in WAL mode: SQLite
+fails it at once, as waiting could deadlock. IMMEDIATE takes the write lock
+at BEGIN, where the busy timeout applies. Statements run in autocommit, the
+reads of most requests, are not affected.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict.get('PRAGMAS', {}).items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict.get('TRANSACTION_MODE')
+        self.cursor().execute(f'BEGIN {mode}' if mode else 'BEGIN')
@@ -0,0 +1,28 @@
+"""Test helpers shared by the apps"""
+from rest_framework.test import APIClient
+
+
+class QueryBudgetClient(APIClient):
+    """
+    Test client failing as soon as a response used more queries
+    than the budget of its view (see store.query_budget).
+    """
+
+    def request(self, **kwargs):
+        response = super().request(**kwargs)
+        recorder = getattr(response, 'query_recorder', None)
+        budget = getattr(response, 'query_budget', None)
+        if recorder is not None and budget is not None and recorder.count > budget:
+            duplicates = '\n'.join(
+                f'{number} x {sql}' for sql, number in recorder.duplicates().items()
+            )
+            raise AssertionError(
+                f'{kwargs["REQUEST_METHOD"]} {kwargs["PATH_INFO"]} made '
+                f'{recorder.count} queries, the budget is {budget}\n{duplicates}'
+            )
+        return response
+
+
+class QueryBudgetMixin:
+    """Check the query budget of every request made by ``self.client``"""
+    client_class = QueryBudgetClient
@@ -0,0 +1,44 @@
+"""Helpers around transaction.on_commit() shared by the apps"""
+from django.db import transaction
+
+
+class OnCommitBatch:
+    """
+    Work done once for a whole transaction, when it commits.
+
+    ``Batch.add(items)`` adds to the batch waiting at the current savepoint
+    level, so rows changed one by one cost one callback, not one each.
+    Outside of a transaction the items are handled right away. A rolled
+    back savepoint drops its batch with the callback.
+    """
+
+    def __init__(self):
+        self.items = []
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        self.run(self.items)
+
+    def run(self, items):
+        raise NotImplementedError
+
+    @classmethod
+    def pending(cls):
+        connection = transaction.get_connection()
+        savepoint_ids = set(connection.savepoint_ids)
+        for sids, callback, _ in connection.run_on_commit:
+            if isinstance(callback, cls) and not callback.done and sids == savepoint_ids:
+                return callback
+        return None
+
+    @classmethod
+    def add(cls, items):
+        batch = cls.pending()
+        if batch is None:
+            batch = cls()
+            batch.items.extend(items)
+            # called right away outside of a transaction
+            transaction.on_commit(batch)
+        else:
+            batch.items.extend(items)